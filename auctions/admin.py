@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Listing, Bid, Comment, Category, User, Order
+from .models import Listing, Bid, Comment, Category, User, Order, SellerDailySales
 # Register your models here.
 
 admin.site.register(Listing)
@@ -7,4 +7,5 @@ admin.site.register(Category)
 admin.site.register(Bid)
 admin.site.register(Comment)
 admin.site.register(User)
-admin.site.register(Order)
\ No newline at end of file
+admin.site.register(Order)
+admin.site.register(SellerDailySales)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Category, Listing, Watchlist
+
+WATCHLIST_COUNT_TIMEOUT = 60 * 60 * 24
+TAXONOMY_TIMEOUT = 60 * 60 * 24
+
+CATEGORIES_VERSION_KEY = "categories:version"
+CATEGORY_COUNTS_VERSION_KEY = "category-counts:version"
+# Anything shown on public catalog pages: listings, bids, reviews, categories
+CATALOG_VERSION_KEY = "catalog:version"
+
+# Per-process copies of versioned values: {version key: (version, value)}
+_local = {}
+
+
+def watchlist_count_key(user_id):
+    return f"watchlist-count:{user_id}"
+
+
+def get_watchlist_count(user):
+    key = watchlist_count_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Watchlist.objects.filter(user=user).count()
+        cache.set(key, count, WATCHLIST_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_watchlist_count(user_id):
+    # Wait for the commit, otherwise a concurrent request could cache the
+    # count from before this change
+    transaction.on_commit(lambda: cache.delete(watchlist_count_key(user_id)))
+
+
+def get_version(version_key):
+    # Versions are the time of the last change in nanoseconds, so they never
+    # repeat (even if the key gets evicted) and double as modification times
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_version(version_key):
+    transaction.on_commit(lambda: cache.set(version_key, time.time_ns(), None))
+
+
+def get_versioned(version_key, loader):
+    # Two layers: this process's copy, then the shared cache, then the
+    # database. Each hit costs one shared cache read of the version.
+    version = get_version(version_key)
+    local = _local.get(version_key)
+    if local is not None and local[0] == version:
+        return local[1]
+    shared_key = f"{version_key}:{version}"
+    value = cache.get(shared_key)
+    if value is None:
+        value = loader()
+        cache.set(shared_key, value, TAXONOMY_TIMEOUT)
+    _local[version_key] = (version, value)
+    return value
+
+
+def get_categories():
+    return get_versioned(
+        CATEGORIES_VERSION_KEY,
+        lambda: list(Category.objects.order_by("name")),
+    )
+
+
+def get_category(name):
+    for category in get_categories():
+        if category.name == name:
+            return category
+    return None
+
+
+def get_category_listing_counts():
+    # {category id: number of active listings}
+    return get_versioned(
+        CATEGORY_COUNTS_VERSION_KEY,
+        lambda: dict(
+            Listing.objects.filter(active=True, category__isnull=False)
+            .order_by()
+            .values_list("category")
+            .annotate(Count("pk"))
+        ),
+    )
+
+
+def invalidate_categories():
+    bump_version(CATEGORIES_VERSION_KEY)
+
+
+def invalidate_category_counts():
+    bump_version(CATEGORY_COUNTS_VERSION_KEY)
+
+
+def invalidate_catalog():
+    bump_version(CATALOG_VERSION_KEY)
@@ -0,0 +1,8 @@
+from .cache import get_watchlist_count
+
+
+def watchlist_count(request):
+    # The watchlist badge in layout.html
+    if not request.user.is_authenticated:
+        return {}
+    return {"count": get_watchlist_count(request.user)}
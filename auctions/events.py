@@ -0,0 +1,170 @@
+"""
+Live listing updates, pushed to browsers as Server-Sent Events.
+
+Write paths call ``publish()`` (after their transaction commits) with a small
+JSON-able event for a listing. Events reach every subscriber of that listing
+in the current process through the in-process broker, and every other
+process on the host through UDP datagrams on the loopback interface: each
+process serving event streams binds a port and registers it as a file in
+``settings.EVENTS_DIR``, so gunicorn workers and the close_auctions worker
+share events without a message broker.
+
+Subscribers are async generators running on the ASGI event loop; an idle
+one is a parked coroutine and a queue, and costs no queries at all.
+"""
+import asyncio
+import atexit
+import json
+import os
+import socket
+import threading
+
+from django.conf import settings
+
+# Seconds between keep-alive comments on an idle stream, to stop proxies
+# from timing the connection out
+HEARTBEAT_INTERVAL = 20
+
+# Events buffered per subscriber before a slow client starts missing them
+QUEUE_SIZE = 64
+
+# Listing id -> set of subscriber queues. Only touched on the event loop.
+_subscribers = {}
+_loop = None
+_port = None
+_receiver_lock = None
+
+_send_socket = None
+_send_lock = threading.Lock()
+_peers = (None, ())
+
+
+def publish(listing_id, event):
+    """Send ``event`` to everyone watching ``listing_id``, on any process."""
+    event = {"listing": listing_id, **event}
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_dispatch, listing_id, event)
+    data = json.dumps(event, separators=(",", ":")).encode()
+    for port in peer_ports():
+        if port != _port:
+            _send(data, port)
+
+
+async def stream(listing_id, heartbeat=HEARTBEAT_INTERVAL):
+    """Yield a listing's events as a text/event-stream body."""
+    queue = await subscribe(listing_id)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        unsubscribe(listing_id, queue)
+
+
+async def subscribe(listing_id):
+    await _ensure_receiver()
+    queue = asyncio.Queue(QUEUE_SIZE)
+    _subscribers.setdefault(listing_id, set()).add(queue)
+    return queue
+
+
+def unsubscribe(listing_id, queue):
+    queues = _subscribers.get(listing_id)
+    if queues is not None:
+        queues.discard(queue)
+        if not queues:
+            del _subscribers[listing_id]
+
+
+def _dispatch(listing_id, event):
+    for queue in _subscribers.get(listing_id, ()):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+class _Receiver(asyncio.DatagramProtocol):
+
+    def datagram_received(self, data, addr):
+        try:
+            event = json.loads(data)
+            _dispatch(event["listing"], event)
+        except (ValueError, KeyError, TypeError):
+            pass
+
+
+async def _ensure_receiver():
+    global _loop, _port, _receiver_lock
+    if _port is not None:
+        return
+    if _receiver_lock is None:
+        _receiver_lock = asyncio.Lock()
+    async with _receiver_lock:
+        if _port is not None:
+            return
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(_Receiver, local_addr=("127.0.0.1", 0))
+        _loop = loop
+        _port = transport.get_extra_info("sockname")[1]
+        _register(_port)
+
+
+def _register(port):
+    directory = settings.EVENTS_DIR
+    os.makedirs(directory, exist_ok=True)
+    _prune(directory)
+    path = os.path.join(directory, str(port))
+    with open(path, "w") as f:
+        f.write(str(os.getpid()))
+    atexit.register(_unregister, path)
+
+
+def _unregister(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _prune(directory):
+    # Drop ports left behind by processes that died without cleaning up
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                os.kill(int(f.read()), 0)
+        except (ProcessLookupError, ValueError):
+            _unregister(path)
+        except OSError:
+            pass
+
+
+def peer_ports():
+    # The port list is re-read only when the directory changes
+    global _peers
+    try:
+        mtime = os.stat(settings.EVENTS_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return ()
+    cached_mtime, ports = _peers
+    if mtime != cached_mtime:
+        ports = tuple(int(name) for name in os.listdir(settings.EVENTS_DIR) if name.isdigit())
+        _peers = (mtime, ports)
+    return ports
+
+
+def _send(data, port):
+    global _send_socket
+    with _send_lock:
+        if _send_socket is None:
+            _send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            _send_socket.sendto(data, ("127.0.0.1", port))
+        except OSError:
+            pass
@@ -1,4 +1,5 @@
 from django import forms
+from django.utils import timezone
 from .models import Listing, Bid, Review
 
 class ListingForm(forms.ModelForm):
@@ -10,6 +11,7 @@ class ListingForm(forms.ModelForm):
             "description",
             "listing_type",
             "starting_bid",
+            "end_time",
             "buy_now_price",
             "stock",
             "image",
@@ -20,6 +22,7 @@ class ListingForm(forms.ModelForm):
             "description": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
             "listing_type": forms.Select(attrs={"class": "form-select"}),
             "starting_bid": forms.NumberInput(attrs={"class": "form-control"}),
+            "end_time": forms.DateTimeInput(attrs={"class": "form-control", "type": "datetime-local"}, format="%Y-%m-%dT%H:%M"),
             "buy_now_price": forms.NumberInput(attrs={"class": "form-control"}),
             "stock": forms.NumberInput(attrs={"class": "form-control"}),
             "image": forms.URLInput(attrs={"class": "form-control"}),
@@ -32,11 +35,16 @@ class ListingForm(forms.ModelForm):
         starting_bid = cleaned_data.get("starting_bid")
         buy_now_price = cleaned_data.get("buy_now_price")
         stock = cleaned_data.get('stock')
+        end_time = cleaned_data.get("end_time")
 
-        if(stock <=0):
+        if stock is not None and stock <= 0:
             self.add_error('stock', "Stock should be greater than 0.")
         if listing_type == Listing.AUCTION and not starting_bid:
             self.add_error("starting_bid", "Starting bid is required for auction listings.")
+        if listing_type == Listing.AUCTION and end_time and end_time <= timezone.now():
+            self.add_error("end_time", "End time must be in the future.")
+        if listing_type == Listing.BUY_NOW:
+            cleaned_data["end_time"] = None
 
         if listing_type == Listing.BUY_NOW and not buy_now_price:
             self.add_error("buy_now_price", "Buy now price is required.")
@@ -49,6 +57,14 @@ class ListingForm(forms.ModelForm):
             return "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcS0JPlBPWAJmuK_QMJjXiY8AlthB5ZinSaJ9Q&s"
         return image
 
+class ListingImportForm(ListingForm):
+    # One row of a bulk import. The same rules as ListingForm; the category
+    # is resolved by name by the importer instead of a query per row.
+
+    class Meta(ListingForm.Meta):
+        fields = [field for field in ListingForm.Meta.fields if field != "category"]
+
+
 class BidForm(forms.ModelForm):
     class Meta:
         model = Bid
@@ -0,0 +1,106 @@
+"""
+Bulk listing import from CSV.
+
+The file is read a line at a time. Each row is validated with
+ListingImportForm (the ListingForm rules, without its per-row category
+query), categories are resolved by name from one map loaded up front, and
+valid rows are inserted with bulk_create a batch at a time. bulk_create
+skips Listing.save() and the post_save signal, so the derived price, the
+search index and the catalog caches are taken care of here.
+"""
+import csv
+
+from django.db import transaction
+
+from . import search
+from .cache import invalidate_catalog, invalidate_category_counts
+from .forms import ListingImportForm
+from .models import Category, Listing
+
+BATCH_SIZE = 500
+
+COLUMNS = ["title", "description", "listing_type", "starting_bid", "buy_now_price", "stock", "end_time", "image", "category"]
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        # (line number, message) for every rejected row
+        self.errors = []
+
+
+def import_listings(lines, seller, batch_size=BATCH_SIZE):
+    """
+    Create listings for ``seller`` from CSV text ``lines`` (any iterable of
+    str, such as an open file), whose header names columns from COLUMNS.
+    Rows that fail validation are skipped and reported in the result. A line
+    that can't be decoded or parsed as CSV stops the import there; the rows
+    before it are kept and counted, and the line is reported.
+    """
+    result = ImportResult()
+    reader = csv.DictReader(lines)
+    batch = []
+    try:
+        missing = {"title", "description"} - set(reader.fieldnames or ())
+        if missing:
+            result.errors.append((1, f"Missing column(s): {', '.join(sorted(missing))}."))
+            return result
+
+        categories = {name.casefold(): pk for pk, name in Category.objects.values_list("pk", "name")}
+        for row in reader:
+            listing = _build(row, reader.line_num, seller, categories, result)
+            if listing is None:
+                continue
+            batch.append(listing)
+            if len(batch) >= batch_size:
+                result.created += _insert(batch)
+                batch = []
+    except UnicodeDecodeError:
+        # Raised reading the line after the last one parsed
+        result.errors.append((reader.line_num + 1, "Not valid UTF-8; the import stopped here."))
+    except csv.Error as error:
+        result.errors.append((reader.line_num, f"Not valid CSV ({error}); the import stopped here."))
+
+    if batch:
+        result.created += _insert(batch)
+    if result.created:
+        invalidate_catalog()
+        invalidate_category_counts()
+    return result
+
+
+def _build(row, line, seller, categories, result):
+    # An unsaved listing for a valid row, or None with its errors recorded
+    data = {column: (row.get(column) or "").strip() for column in COLUMNS}
+    if not data["listing_type"]:
+        data["listing_type"] = Listing.AUCTION
+    if not data["stock"]:
+        data["stock"] = "1"
+
+    category_id = None
+    if data["category"]:
+        category_id = categories.get(data["category"].casefold())
+        if category_id is None:
+            result.errors.append((line, f"category: Unknown category '{data['category']}'."))
+            return None
+
+    form = ListingImportForm(data)
+    if not form.is_valid():
+        for field, messages in form.errors.items():
+            prefix = "" if field == "__all__" else f"{field}: "
+            result.errors.extend((line, f"{prefix}{message}") for message in messages)
+        return None
+
+    listing = form.save(commit=False)
+    listing.creator = seller
+    listing.category_id = category_id
+    listing.effective_price = listing.current_price
+    return listing
+
+
+def _insert(batch):
+    with transaction.atomic():
+        created = Listing.objects.bulk_create(batch)
+        search.index_listings(listing.pk for listing in created)
+    return len(created)
@@ -0,0 +1,30 @@
+import threading
+import time
+
+from django.db import connection
+
+
+def run_concurrently(worker, threads):
+    """
+    Call ``worker(thread_index)`` from ``threads`` threads released at the
+    same moment. Returns the wall time and each thread's return value.
+    Every thread gets its own database connection and closes it afterwards.
+    """
+    barrier = threading.Barrier(threads + 1)
+    results = [None] * threads
+
+    def target(index):
+        try:
+            barrier.wait()
+            results[index] = worker(index)
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=target, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started, results
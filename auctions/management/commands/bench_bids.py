@@ -0,0 +1,97 @@
+import random
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from auctions import services
+from auctions.models import Bid, Listing, User
+
+from ._bench import run_concurrently
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a single auction with concurrent bidders and report accepted "
+        "bids per second and any violated invariants. Works on a throwaway "
+        "listing and users in the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bids", type=int, default=200, help="Bids attempted per thread.")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark listing and users.")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        rng = random.Random(options["seed"])
+        tag = uuid.uuid4().hex[:8]
+
+        seller = User.objects.create_user(f"bench-seller-{tag}", role=User.SELLER)
+        bidders = [User.objects.create_user(f"bench-bidder-{tag}-{i}") for i in range(threads)]
+        listing = Listing.objects.create(
+            title=f"Benchmark auction {tag}",
+            description="Created by bench_bids",
+            starting_bid=Decimal("1.00"),
+            creator=seller,
+        )
+        increments = [
+            [Decimal(rng.randint(1, 100)) / 100 for _ in range(options["bids"])]
+            for _ in range(threads)
+        ]
+
+        def bid_rush(index):
+            outcome = Counter()
+            for increment in increments[index]:
+                # Bid on what this bidder last saw, like a user who loaded
+                # the page a moment ago
+                seen = Listing.objects.filter(pk=listing.pk).values_list("effective_price", flat=True).get()
+                try:
+                    services.place_bid(listing, bidders[index], seen + increment)
+                    outcome["accepted"] += 1
+                except services.BidRejected:
+                    outcome["rejected"] += 1
+                except OperationalError:
+                    outcome["errors"] += 1
+            return outcome
+
+        try:
+            elapsed, results = run_concurrently(bid_rush, threads)
+            totals = sum(results, Counter())
+            listing.refresh_from_db()
+            violations = self.check_invariants(listing, totals["accepted"])
+
+            self.stdout.write(
+                f"{threads} threads, {threads * options['bids']} bids attempted in {elapsed:.2f}s"
+            )
+            self.stdout.write(
+                f"accepted: {totals['accepted']} ({totals['accepted'] / elapsed:.1f}/s), "
+                f"rejected: {totals['rejected']}, errors: {totals['errors']}"
+            )
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(violation))
+            if not violations:
+                self.stdout.write(self.style.SUCCESS("No invariant violations."))
+        finally:
+            if not options["keep"]:
+                listing.delete()
+                User.objects.filter(pk__in=[seller.pk, *(bidder.pk for bidder in bidders)]).delete()
+
+    def check_invariants(self, listing, accepted):
+        violations = []
+        amounts = list(Bid.objects.filter(listing=listing).order_by("pk").values_list("amount", flat=True))
+        if len(amounts) != accepted:
+            violations.append(f"{accepted} bids accepted but {len(amounts)} stored")
+        if listing.bid_count != len(amounts):
+            violations.append(f"bid_count is {listing.bid_count}, {len(amounts)} bids stored")
+        if any(later <= earlier for earlier, later in zip(amounts, amounts[1:])):
+            violations.append("accepted bids are not strictly increasing")
+        if amounts and listing.highest_bid_amount != max(amounts):
+            violations.append(f"highest_bid_amount is {listing.highest_bid_amount}, top bid is {max(amounts)}")
+        top_bid = Bid.objects.filter(listing=listing).order_by("-amount", "pk").first()
+        if top_bid and listing.highest_bidder_id != top_bid.bidder_id:
+            violations.append("highest_bidder does not hold the top bid")
+        return violations
@@ -0,0 +1,96 @@
+import random
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.db.models import Sum
+
+from auctions import services
+from auctions.models import Listing, Order, User
+
+from ._bench import run_concurrently
+
+
+class Command(BaseCommand):
+    help = (
+        "Flash-sale load test: concurrent buyers race for the stock of one Buy "
+        "Now listing, then the run is checked for oversells. Works on a "
+        "throwaway listing and users in the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--stock", type=int, default=500)
+        parser.add_argument("--attempts", type=int, default=100, help="Purchases attempted per thread.")
+        parser.add_argument("--max-quantity", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark listing, orders and users.")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        rng = random.Random(options["seed"])
+        tag = uuid.uuid4().hex[:8]
+
+        seller = User.objects.create_user(f"bench-seller-{tag}", role=User.SELLER)
+        buyers = [User.objects.create_user(f"bench-buyer-{tag}-{i}") for i in range(threads)]
+        listing = Listing.objects.create(
+            title=f"Flash sale {tag}",
+            description="Created by bench_checkout",
+            listing_type=Listing.BUY_NOW,
+            buy_now_price=Decimal("9.99"),
+            stock=options["stock"],
+            creator=seller,
+        )
+        quantities = [
+            [rng.randint(1, options["max_quantity"]) for _ in range(options["attempts"])]
+            for _ in range(threads)
+        ]
+
+        def shop(index):
+            outcome = Counter()
+            for quantity in quantities[index]:
+                try:
+                    services.buy_now(listing, buyers[index], quantity)
+                    outcome["orders"] += 1
+                    outcome["units"] += quantity
+                except services.PurchaseRejected:
+                    outcome["rejected"] += 1
+                except OperationalError:
+                    outcome["errors"] += 1
+            return outcome
+
+        try:
+            elapsed, results = run_concurrently(shop, threads)
+            totals = sum(results, Counter())
+            listing.refresh_from_db()
+            violations = self.check_invariants(listing, options["stock"], totals["units"])
+
+            attempts = threads * options["attempts"]
+            self.stdout.write(f"{threads} threads, {attempts} purchases attempted in {elapsed:.2f}s ({attempts / elapsed:.1f}/s)")
+            self.stdout.write(
+                f"orders: {totals['orders']} ({totals['orders'] / elapsed:.1f}/s), units sold: {totals['units']}, "
+                f"rejected: {totals['rejected']}, errors: {totals['errors']}, stock left: {listing.stock}"
+            )
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(violation))
+            if not violations:
+                self.stdout.write(self.style.SUCCESS("No oversells."))
+        finally:
+            if not options["keep"]:
+                listing.delete()
+                User.objects.filter(pk__in=[seller.pk, *(buyer.pk for buyer in buyers)]).delete()
+
+    def check_invariants(self, listing, initial_stock, units_sold):
+        violations = []
+        ordered = Order.objects.filter(listing=listing).aggregate(units=Sum("quantity"))["units"] or 0
+        if ordered > initial_stock:
+            violations.append(f"oversold: {ordered} units ordered from a stock of {initial_stock}")
+        if ordered != units_sold:
+            violations.append(f"{units_sold} units reported sold but {ordered} ordered")
+        if listing.stock != initial_stock - ordered:
+            violations.append(f"stock is {listing.stock}, expected {initial_stock - ordered}")
+        if listing.stock == 0 and listing.active:
+            violations.append("sold out listing is still active")
+        return violations
@@ -0,0 +1,174 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test.utils import override_settings
+
+from auctions import services
+from auctions.models import Bid, Listing, User
+
+from ._bench import run_concurrently
+
+# Django's SQLite defaults: rollback journal, DEFERRED transactions, a five
+# second busy timeout and a new connection per request
+STOCK = {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}}
+
+# Keep cache writes out of the shared file cache and equal for both runs
+PRIVATE_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench_sqlite"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mixed read/write load (catalog and listing reads, bids and Buy Now "
+        "purchases) against a copy of the database, once with Django's stock "
+        "SQLite settings and once with the configured connection profile. "
+        "Reports throughput, latency and lock errors for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--ops", type=int, default=300, help="Operations per thread.")
+        parser.add_argument("--write-share", type=float, default=0.2, help="Share of operations that write.")
+        parser.add_argument("--listings", type=int, default=20, help="Auctions and Buy Now listings written to.")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite compares SQLite connection settings.")
+        configured = connections.settings["default"]
+        tuned = {key: configured[key] for key in STOCK}
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES=PRIVATE_CACHE):
+            source = os.path.join(directory, "source.sqlite3")
+            self.copy_database(source)
+            runs = {}
+            for name, profile in [("stock", STOCK), ("tuned", tuned)]:
+                path = os.path.join(directory, f"{name}.sqlite3")
+                with sqlite3.connect(source) as origin, sqlite3.connect(path) as target:
+                    origin.backup(target)
+                runs[name] = self.run(configured, path, profile, options)
+                self.report(name, runs[name])
+
+        stock, tuned = runs["stock"], runs["tuned"]
+        self.stdout.write(
+            f"throughput x{tuned['throughput'] / stock['throughput']:.2f}, "
+            f"p95 latency x{tuned['p95'] / stock['p95']:.2f}, "
+            f"lock errors {stock['errors']} -> {tuned['errors']}"
+        )
+
+    def copy_database(self, path):
+        # The backup API gives a consistent snapshot even while other
+        # processes write
+        connection.ensure_connection()
+        with sqlite3.connect(path) as target:
+            connection.connection.backup(target)
+        connection.close()
+
+    def run(self, configured, path, profile, options):
+        saved = dict(configured)
+        configured.update(profile, NAME=path)
+        connection.close()
+        try:
+            if not profile["OPTIONS"]:
+                # The copy keeps the source's journal mode
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=DELETE")
+            return self.load(options)
+        finally:
+            connection.close()
+            configured.clear()
+            configured.update(saved)
+
+    def load(self, options):
+        threads = options["threads"]
+        rng = random.Random(options["seed"])
+        tag = uuid.uuid4().hex[:8]
+
+        seller = User.objects.create_user(f"bench-seller-{tag}", role=User.SELLER)
+        buyers = [User.objects.create_user(f"bench-buyer-{tag}-{i}") for i in range(threads)]
+        auctions = [
+            Listing.objects.create(
+                title=f"Benchmark auction {tag}-{i}",
+                description="Created by bench_sqlite",
+                starting_bid=Decimal("1.00"),
+                creator=seller,
+            )
+            for i in range(options["listings"])
+        ]
+        stocked = [
+            Listing.objects.create(
+                title=f"Benchmark stock {tag}-{i}",
+                description="Created by bench_sqlite",
+                listing_type=Listing.BUY_NOW,
+                buy_now_price=Decimal("9.99"),
+                stock=threads * options["ops"],
+                creator=seller,
+            )
+            for i in range(options["listings"])
+        ]
+        plans = [
+            [(rng.random() < options["write_share"], rng.randrange(options["listings"])) for _ in range(options["ops"])]
+            for _ in range(threads)
+        ]
+
+        def traffic(index):
+            outcome = Counter(latencies=[])
+            for write, target in plans[index]:
+                # What a request does: connections past CONN_MAX_AGE are
+                # closed as it starts and again as it finishes
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    if write and target % 2:
+                        listing = auctions[target]
+                        seen = Listing.objects.filter(pk=listing.pk).values_list("effective_price", flat=True).get()
+                        services.place_bid(listing, buyers[index], seen + Decimal("0.01"))
+                    elif write:
+                        services.buy_now(stocked[target], buyers[index], 1)
+                    else:
+                        self.browse(auctions[target])
+                    outcome["writes" if write else "reads"] += 1
+                except (services.BidRejected, services.PurchaseRejected):
+                    outcome["rejected"] += 1
+                except OperationalError:
+                    outcome["errors"] += 1
+                outcome["latencies"].append(time.perf_counter() - started)
+                close_old_connections()
+            return outcome
+
+        elapsed, results = run_concurrently(traffic, threads)
+        latencies = sorted(latency for result in results for latency in result.pop("latencies"))
+        totals = sum(results, Counter())
+        return {
+            "elapsed": elapsed,
+            "ops": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "reads": totals["reads"],
+            "writes": totals["writes"],
+            "rejected": totals["rejected"],
+            "errors": totals["errors"],
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95)],
+        }
+
+    def browse(self, listing):
+        # The queries behind a catalog page and a listing page
+        list(Listing.objects.filter(active=True).select_related("creator").order_by("-date_time", "-pk")[:24])
+        Listing.objects.select_related("creator", "highest_bidder").get(pk=listing.pk)
+        list(Bid.objects.filter(listing=listing).select_related("bidder").order_by("-amount")[:10])
+
+    def report(self, name, run):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"  {run['ops']} operations in {run['elapsed']:.2f}s ({run['throughput']:.1f}/s): "
+            f"{run['reads']} reads, {run['writes']} writes, {run['rejected']} rejected, {run['errors']} errors"
+        )
+        self.stdout.write(f"  latency p50 {run['p50'] * 1000:.1f}ms, p95 {run['p95'] * 1000:.1f}ms")
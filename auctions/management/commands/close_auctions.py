@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions import services
+
+
+class Command(BaseCommand):
+    help = (
+        "Close auctions whose end time has passed, recording the winner and "
+        "final price and creating the winning order. With --loop it keeps "
+        "running as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling for expired auctions.")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds between polls with --loop.")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                closed = self.close_expired(options["batch_size"])
+                if closed:
+                    self.stdout.write(f"Closed {closed} auction(s).")
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+    def close_expired(self, batch_size):
+        # Drain the backlog a batch (and a transaction) at a time, so bids
+        # on other listings aren't held up behind one long write
+        total = 0
+        while True:
+            close_old_connections()
+            closed = services.close_expired_auctions(batch_size)
+            total += closed
+            if closed < batch_size:
+                return total
@@ -0,0 +1,128 @@
+import html
+import re
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from auctions import services
+from auctions.models import Bid, Category, Listing, Order, User
+
+# Tables that are read whole on purpose
+EXPECTED_SCANS = {"auctions_category", "django_session"}
+
+NEXT_LINK = re.compile(r'href="(\?[^"]*after=[^"]*)"')
+
+# A private cache, emptied before every scenario so each one runs cold
+COLD_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "explain_queries"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every page as representative users with a cold cache, run each "
+        "query through EXPLAIN QUERY PLAN and flag full table scans. Nothing is "
+        "written: the run is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyer", help="Username to browse as a buyer (default: the most active bidder).")
+        parser.add_argument("--seller", help="Username to browse as a seller (default: the seller with most listings).")
+        parser.add_argument("--verbose", action="store_true", help="Print the plan of every query, not just flagged ones.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("explain_queries reads SQLite query plans.")
+        buyer = self.pick_user(options["buyer"], Bid.objects.values("bidder"), "bidder")
+        seller = self.pick_user(options["seller"], Listing.objects.filter(creator__role=User.SELLER).values("creator"), "creator")
+
+        flagged = 0
+        # Queries are captured on the primary, so keep reads off any replicas
+        with override_settings(CACHES=COLD_CACHE, ALLOWED_HOSTS=["*"], DATABASE_REPLICAS={}), transaction.atomic():
+            for label, run in self.scenarios(buyer, seller):
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    run()
+                flagged += self.report(label, captured.captured_queries, options["verbose"])
+            transaction.set_rollback(True)
+
+        if flagged:
+            raise CommandError(f"{flagged} quer{'y' if flagged == 1 else 'ies'} with full table scans.")
+        self.stdout.write(self.style.SUCCESS("No full table scans."))
+
+    def pick_user(self, username, rows, field):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}.")
+        top = rows.annotate(n=Count("pk")).order_by("-n").values_list(field, flat=True).first()
+        return User.objects.filter(pk=top).first() if top else None
+
+    def scenarios(self, buyer, seller):
+        anonymous = Client()
+        listing = Listing.objects.filter(active=True).order_by("-pk").first()
+        category = Category.objects.order_by("pk").first()
+
+        def get(client, name, *args, query=""):
+            return lambda: client.get(reverse(name, args=args) + query)
+
+        yield "index", get(anonymous, "index")
+        yield "index, second page", lambda: anonymous.get(reverse("index") + self.next_page(anonymous, "index"))
+        yield "index, price sort", get(anonymous, "index", query="?sort=price_asc&min_price=1")
+        yield "index, search", get(anonymous, "index", query="?q=a")
+        yield "categories", get(anonymous, "categories")
+        if category:
+            yield "category", get(anonymous, "category", category.name)
+        if listing:
+            yield "listing", get(anonymous, "listing", listing.pk)
+        yield "close_expired_auctions", lambda: services.close_expired_auctions(batch_size=1)
+
+        if buyer:
+            client = Client()
+            client.force_login(buyer)
+            yield f"watchlist ({buyer})", get(client, "watchlist")
+            yield f"purchased ({buyer})", get(client, "purchased_items")
+            yield f"auctioned ({buyer})", get(client, "auctioned_listings")
+        if seller:
+            client = Client()
+            client.force_login(seller)
+            for tab in ["listings", Order.PENDING, Order.PROCESSED, Order.COMPLETED, Order.CANCELLED]:
+                yield f"seller dashboard {tab} ({seller})", get(client, "seller_dashboard", query=f"?tab={tab}")
+            yield f"seller sales ({seller})", get(client, "seller_sales")
+
+    def next_page(self, client, name):
+        # The "Next" link of the first page, as rendered
+        match = NEXT_LINK.search(client.get(reverse(name)).content.decode())
+        return html.unescape(match[1]) if match else ""
+
+    def report(self, label, queries, verbose):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: {len(queries)} queries"))
+        flagged = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query["sql"]
+                if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+                scans = [step for step in plan if self.is_full_scan(step)]
+                if scans:
+                    flagged += 1
+                if scans or verbose:
+                    self.stdout.write(f"  {sql[:300]}")
+                    for step in plan:
+                        line = f"    {step}"
+                        self.stdout.write(self.style.ERROR(line) if step in scans else line)
+        return flagged
+
+    def is_full_scan(self, step):
+        # "SCAN t" reads the whole table; "SCAN t USING [COVERING] INDEX"
+        # walks an index in order and "SEARCH" seeks into one
+        words = step.split()
+        if len(words) < 2 or words[0] != "SCAN" or "USING" in words or "VIRTUAL" in words:
+            return False
+        return words[1] not in EXPECTED_SCANS
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import exports
+
+
+class Command(BaseCommand):
+    help = "Stream listings, bids or orders as NDJSON or CSV to stdout or a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(exports.EXPORTS))
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="ndjson")
+        parser.add_argument("--since", help="Only rows changed (listings) or created (orders) at or after this ISO datetime.")
+        parser.add_argument("--since-id", help="Only rows with a larger id.")
+        parser.add_argument("--output", "-o", help="File to write instead of stdout.")
+        parser.add_argument("--batch-size", type=int, default=exports.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        export = exports.EXPORTS[options["kind"]]
+        try:
+            since, since_id = exports.parse_filters(options["since"], options["since_id"], export)
+        except exports.ExportError as error:
+            raise CommandError(error)
+
+        batches = export.batches(since=since, since_id=since_id, batch_size=options["batch_size"])
+        writer = exports.csv_chunks if options["format"] == "csv" else exports.ndjson_chunks
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                for chunk in writer(export, batches):
+                    f.write(chunk)
+        else:
+            for chunk in writer(export, batches):
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import imports
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = "Bulk-create listings for a seller from a CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--seller", required=True, help="Username of the seller who will own the listings.")
+        parser.add_argument("--batch-size", type=int, default=imports.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options["seller"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['seller']!r}.")
+        if not seller.is_seller():
+            raise CommandError(f"{seller.username} is not a seller.")
+
+        started = time.perf_counter()
+        with open(options["path"], newline="", encoding="utf-8-sig") as f:
+            result = imports.import_listings(f, seller, batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} listings in {elapsed:.1f}s, {len(result.errors)} problem(s)."
+        ))
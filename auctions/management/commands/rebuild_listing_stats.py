@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auctions.models import Listing
+
+STAT_FIELDS = [
+    ("highest_bid_amount", "source_highest_bid_amount"),
+    ("highest_bidder_id", "source_highest_bidder"),
+    ("bid_count", "source_bid_count"),
+    ("rating_sum", "source_rating_sum"),
+    ("rating_count", "source_rating_count"),
+    ("effective_price", "source_effective_price"),
+]
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored bid/review aggregates and effective prices on listings and verify them against the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report listings whose stored aggregates are stale; exit with an error if any are.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            with transaction.atomic():
+                updated = Listing.objects.rebuild_stats()
+            self.stdout.write(f"Rebuilt aggregates for {updated} listings.")
+
+        stale = 0
+        for pk, field, stored, actual in self.find_stale(options["chunk_size"]):
+            stale += 1
+            self.stdout.write(f"Listing #{pk}: {field} is {stored!r}, expected {actual!r}")
+
+        if stale:
+            raise CommandError(f"{stale} stale aggregate value(s) found.")
+        self.stdout.write(self.style.SUCCESS("All listing aggregates match the source tables."))
+
+    def find_stale(self, chunk_size):
+        rows = Listing.objects.with_source_stats().values_list(
+            "pk", *(field for pair in STAT_FIELDS for field in pair)
+        )
+        for row in rows.iterator(chunk_size=chunk_size):
+            values = iter(row[1:])
+            for (field, _), stored, actual in zip(STAT_FIELDS, values, values):
+                if stored != actual:
+                    yield row[0], field, stored, actual
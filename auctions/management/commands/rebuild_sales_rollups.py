@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auctions import rollups
+from auctions.models import SellerDailySales
+
+COUNTERS = [("orders", "order_count"), ("units", "unit_count"), ("revenue", "revenue_sum")]
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-seller daily sales rollups from orders and verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report rollup rows that differ from the orders; exit with an error if any do.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            with transaction.atomic():
+                SellerDailySales.objects.all().delete()
+                created = SellerDailySales.objects.bulk_create(
+                    [
+                        SellerDailySales(
+                            seller_id=row["seller_id"],
+                            day=row["day"],
+                            status=row["status_value"],
+                            **{field: row[source] for field, source in COUNTERS},
+                        )
+                        for row in rollups.rollups_from_orders().iterator()
+                    ],
+                    batch_size=500,
+                )
+            self.stdout.write(f"Rebuilt {len(created)} rollup rows.")
+
+        stale = 0
+        for key, field, stored, actual in self.find_stale():
+            stale += 1
+            self.stdout.write(f"Seller #{key[0]} {key[1]} {key[2]}: {field} is {stored}, expected {actual}")
+
+        if stale:
+            raise CommandError(f"{stale} stale rollup value(s) found.")
+        self.stdout.write(self.style.SUCCESS("All sales rollups match the orders."))
+
+    def find_stale(self):
+        expected = {
+            (row["seller_id"], row["day"], row["status_value"]): row
+            for row in rollups.rollups_from_orders().iterator()
+        }
+        rows = SellerDailySales.objects.values("seller_id", "day", "status", *(field for field, _ in COUNTERS))
+        for row in rows.iterator():
+            key = (row["seller_id"], row["day"], row["status"])
+            source = expected.pop(key, None)
+            for field, source_field in COUNTERS:
+                actual = source[source_field] if source else 0
+                if row[field] != actual:
+                    yield key, field, row[field], actual
+        for key, source in expected.items():
+            for field, source_field in COUNTERS:
+                if source[source_field]:
+                    yield key, field, 0, source[source_field]
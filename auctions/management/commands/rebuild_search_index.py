@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auctions import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all listings."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("Full-text search needs SQLite with FTS5.")
+        with transaction.atomic():
+            indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} listings."))
@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from auctions import seeding
+from auctions.models import Order
+
+
+def status_weights(value):
+    # "pending=2,completed=5" -> {"pending": 2, "completed": 5}
+    weights = {}
+    for part in value.split(","):
+        status, _, weight = part.partition("=")
+        if status not in dict(Order.STATUS_CHOICES):
+            raise ValueError(f"unknown status {status!r}")
+        weights[status] = float(weight)
+    if not any(weights.values()):
+        raise ValueError("at least one weight must be positive")
+    return weights
+
+
+def base_time(value):
+    # ISO 8601; a time without an offset is in the current time zone
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"not a date and time: {value!r}")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic marketplace for load testing: users, categories, "
+        "listings, bids, watchlists, orders and reviews. The same seed and options always "
+        "generate the same data when --now is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="seed", help="Prefix for generated usernames (must be unused).")
+        parser.add_argument("--password", default="password", help="Password of every generated user.")
+        parser.add_argument("--buyers", type=int, default=1000)
+        parser.add_argument("--sellers", type=int, default=100)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--listings", type=int, default=10000)
+        parser.add_argument("--buy-now-share", type=float, default=0.4, help="Fraction of listings that are Buy Now.")
+        parser.add_argument("--closed-share", type=float, default=0.3, help="Fraction of auctions that have ended.")
+        parser.add_argument("--bids-per-auction", type=float, default=8.0, help="Mean bids per auction.")
+        parser.add_argument("--orders-per-listing", type=float, default=3.0, help="Mean orders per Buy Now listing.")
+        parser.add_argument("--watchlists-per-buyer", type=float, default=5.0, help="Mean watched listings per buyer.")
+        parser.add_argument("--review-share", type=float, default=0.4, help="Fraction of completed orders reviewed.")
+        parser.add_argument(
+            "--order-statuses",
+            type=status_weights,
+            default=seeding.DEFAULT_ORDER_STATUSES,
+            help="Relative weights of final order statuses, e.g. pending=2,processed=2,completed=5,cancelled=1.",
+        )
+        parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for activity per user (0 = uniform).")
+        parser.add_argument("--days", type=int, default=90, help="Days of history to spread listings and orders over.")
+        parser.add_argument(
+            "--now",
+            type=base_time,
+            default=None,
+            help="Base time for every generated timestamp, e.g. 2026-01-01T12:00:00Z (default: the current time).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for name in ("buy_now_share", "closed_share", "review_share"):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1.")
+        if options["sellers"] < 1 or options["buyers"] < 2:
+            raise CommandError("At least one seller and two buyers are needed.")
+
+        seeder = seeding.Seeder(**{
+            name: options[name] for name in (
+                "seed", "prefix", "password", "buyers", "sellers", "categories", "listings",
+                "buy_now_share", "closed_share", "bids_per_auction", "orders_per_listing",
+                "watchlists_per_buyer", "review_share", "order_statuses", "skew", "days", "batch_size", "now",
+            )
+        })
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{result.counts.get('Listing', 0)} listings, {result.total} rows, {elapsed:.1f}s")
+
+        try:
+            result = seeder.run(progress=progress)
+        except ValueError as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+
+        for model, rows in sorted(result.counts.items()):
+            self.stdout.write(f"  {model}: {rows}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.total} rows in {elapsed:.1f}s ({result.total / elapsed * 60:,.0f} rows/minute)."
+        ))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_stats(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    Review = apps.get_model('auctions', 'Review')
+
+    bids = Bid.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    top_bid = Bid.objects.filter(listing=OuterRef('pk')).order_by('-amount', 'pk')
+    Listing.objects.update(
+        highest_bid_amount=Subquery(bids.annotate(value=Max('amount')).values('value')),
+        highest_bidder=Subquery(top_bid.values('bidder')[:1]),
+        bid_count=Coalesce(Subquery(bids.annotate(value=Count('pk')).values('value')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0011_order_delivery_date_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bid_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bidder',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
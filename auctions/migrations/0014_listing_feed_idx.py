@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0013_listing_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['date_time', 'id'], name='listing_feed_idx'),
+        ),
+    ]
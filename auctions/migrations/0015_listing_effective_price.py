@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:48
+
+from django.db import migrations, models
+from django.db.models import Case, F, When
+from django.db.models.functions import Coalesce
+
+
+def populate_effective_price(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Listing.objects.update(
+        effective_price=Case(
+            When(listing_type='buy_now', then=F('buy_now_price')),
+            default=Coalesce(F('highest_bid_amount'), F('starting_bid')),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0014_listing_feed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='effective_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['effective_price', 'id'], name='listing_price_idx'),
+        ),
+        migrations.RunPython(populate_effective_price, migrations.RunPython.noop),
+    ]
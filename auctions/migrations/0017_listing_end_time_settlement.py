@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def settle_closed_auctions(apps, schema_editor):
+    # Auctions closed before settlement existed were won by their highest
+    # bidder; no orders are created for them retroactively
+    Listing = apps.get_model('auctions', 'Listing')
+    Listing.objects.filter(active=False, listing_type='auction').update(
+        winner=F('highest_bidder'),
+        final_price=F('highest_bid_amount'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_listing_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='final_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='winner',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won_listings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['end_time', 'id'], name='listing_end_time_idx'),
+        ),
+        migrations.RunPython(settle_closed_auctions, migrations.RunPython.noop),
+    ]
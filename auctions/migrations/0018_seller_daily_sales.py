@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Order = apps.get_model('auctions', 'Order')
+    SellerDailySales = apps.get_model('auctions', 'SellerDailySales')
+    rows = Order.objects.values(
+        seller_id=F('listing__creator'),
+        day=TruncDate('created_at'),
+        status_value=F('status'),
+    ).annotate(
+        order_count=Count('pk'),
+        unit_count=Sum('quantity'),
+        revenue_sum=Sum(ExpressionWrapper(
+            F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        )),
+    ).order_by()
+    SellerDailySales.objects.bulk_create([
+        SellerDailySales(
+            seller_id=row['seller_id'],
+            day=row['day'],
+            status=row['status_value'],
+            orders=row['order_count'],
+            units=row['unit_count'],
+            revenue=row['revenue_sum'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_listing_end_time_settlement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerDailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('seller', 'day', 'status')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_seller_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['listing', 'amount'], name='bid_listing_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['bidder', 'listing', 'amount'], name='bid_bidder_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('active', True)), fields=['category', 'date_time', 'id'], name='listing_category_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['creator', 'date_time', 'id'], name='listing_creator_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['buyer', 'status', 'created_at'], name='order_buyer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['listing', 'status', 'created_at'], name='order_listing_status_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:59
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_updated_at(apps, schema_editor):
+    # The last full save is the best record there is of earlier changes
+    Listing = apps.get_model('auctions', 'Listing')
+    Listing.objects.update(updated_at=F('date_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['updated_at'], name='listing_updated_at_idx'),
+        ),
+        migrations.RunPython(populate_updated_at, migrations.RunPython.noop),
+    ]
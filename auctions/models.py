@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Case, CharField, Count, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -26,7 +29,62 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
- 
+
+def listing_stats_from_source():
+    # The stored bid/review aggregates on Listing, recomputed from the source
+    # tables as correlated subqueries.
+    bids = Bid.objects.filter(listing=OuterRef("pk")).order_by().values("listing")
+    reviews = Review.objects.filter(listing=OuterRef("pk")).order_by().values("listing")
+    top_bid = Bid.objects.filter(listing=OuterRef("pk")).order_by("-amount", "pk")
+    highest_bid_amount = Subquery(bids.annotate(value=Max("amount")).values("value"))
+    return {
+        "highest_bid_amount": highest_bid_amount,
+        "highest_bidder": Subquery(top_bid.values("bidder")[:1]),
+        "bid_count": Coalesce(Subquery(bids.annotate(value=Count("pk")).values("value")), 0),
+        "rating_sum": Coalesce(Subquery(reviews.annotate(value=Sum("rating")).values("value")), 0),
+        "rating_count": Coalesce(Subquery(reviews.annotate(value=Count("pk")).values("value")), 0),
+        "effective_price": Case(
+            When(listing_type=Listing.BUY_NOW, then=F("buy_now_price")),
+            default=Coalesce(highest_bid_amount, F("starting_bid")),
+        ),
+    }
+
+
+class ListingQuerySet(models.QuerySet):
+
+    def with_source_stats(self):
+        # Annotates source_<field> next to each stored aggregate
+        return self.annotate(**{
+            f"source_{name}": expression
+            for name, expression in listing_stats_from_source().items()
+        })
+
+    def rebuild_stats(self):
+        return self.update(**listing_stats_from_source())
+
+    def bid_on_by(self, user):
+        """
+        Auctions ``user`` has bid on, each annotated with the user's highest
+        bid (user_max_bid), the bid that leads or won (winning_bid) and an
+        outcome of "active", "won" or "lost". Filtering on outcome keeps it
+        one statement.
+        """
+        user_bids = Bid.objects.filter(listing=OuterRef("pk"), bidder=user).order_by().values("listing")
+        return self.filter(
+            listing_type=Listing.AUCTION,
+            pk__in=Bid.objects.filter(bidder=user).values("listing"),
+        ).annotate(
+            user_max_bid=Subquery(user_bids.annotate(value=Max("amount")).values("value")),
+            winning_bid=Coalesce("final_price", "highest_bid_amount"),
+            outcome=Case(
+                When(active=True, then=Value("active")),
+                When(winner=user, then=Value("won")),
+                default=Value("lost"),
+                output_field=CharField(),
+            ),
+        )
+
+
 class Listing(models.Model):
 
     AUCTION = "auction"
@@ -67,26 +125,118 @@ class Listing(models.Model):
     active = models.BooleanField(default=True)
     stock = models.PositiveIntegerField(default=1)
 
+    # Denormalized from Bid and Review, kept up to date by auctions.services
+    highest_bid_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    highest_bidder = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # What a buyer pays right now: the buy now price, or the highest bid
+    # (falling back to the starting bid) for auctions. Set in save() and by
+    # services.place_bid so price filters and sorting can use an index.
+    effective_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    # Auctions with an end time are closed by the close_auctions worker once
+    # it passes; without one they run until the seller closes them.
+    end_time = models.DateTimeField(null=True, blank=True)
+
+    # Settlement, written once when an auction closes
+    winner = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="won_listings"
+    )
+    final_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    # Bumped on every write that changes how the listing renders; rendered
+    # fragments are cached under (id, version).
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    # When the listing last changed, set by save() and alongside version by
+    # every UPDATE in auctions.services. Incremental exports filter on it;
+    # date_time only moves on a full save().
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Newest-first catalog pages seek on (date_time, id). Partial, as
+            # Django filters active=True as a bare "active" term, which SQLite
+            # can match against an index condition but not an index column.
+            models.Index(fields=["date_time", "id"], condition=Q(active=True), name="listing_feed_idx"),
+            models.Index(fields=["effective_price", "id"], condition=Q(active=True), name="listing_price_idx"),
+            # Only open auctions carry a pending end time worth scanning
+            models.Index(fields=["end_time", "id"], condition=Q(active=True), name="listing_end_time_idx"),
+            # Category pages and a seller's own listings, newest first
+            models.Index(fields=["category", "date_time", "id"], condition=Q(active=True), name="listing_category_feed_idx"),
+            models.Index(fields=["creator", "date_time", "id"], name="listing_creator_feed_idx"),
+            # Incremental exports of what changed since a point in time
+            models.Index(fields=["updated_at"], name="listing_updated_at_idx"),
+        ]
+
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
         return None
 
 
     def __str__(self):
         return self.title
-    
-    def highest_bid(self):
-        return self.bids.order_by("-amount").first()
-    
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.current_price
+        self.updated_at = timezone.now()
+        derived = ["effective_price", "updated_at"]
+        bump_version = not self._state.adding
+        if bump_version:
+            self.version = F("version") + 1
+            derived.append("version")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *derived}
+        super().save(*args, **kwargs)
+        if bump_version:
+            # Drop the expression; the new value is loaded if it is read
+            del self.__dict__["version"]
+
     @property
     def current_price(self):
         if self.listing_type == self.BUY_NOW:
             return self.buy_now_price
-        return self.highest_bid().amount if self.highest_bid() else self.starting_bid
+        if self.highest_bid_amount is not None:
+            return self.highest_bid_amount
+        return self.starting_bid
 
-    
 
 
 class Bid(models.Model):
@@ -94,6 +244,14 @@ class Bid(models.Model):
     bidder = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids")
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="bids")
 
+    class Meta:
+        indexes = [
+            # Top bid per listing, and a bidder's bids per listing (covering
+            # the user's max bid lookup)
+            models.Index(fields=["listing", "amount"], name="bid_listing_amount_idx"),
+            models.Index(fields=["bidder", "listing", "amount"], name="bid_bidder_listing_idx"),
+        ]
+
     def __str__(self):
         return f"${self.amount} by {self.bidder.username} on {self.listing.title}"
 
@@ -139,6 +297,14 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
     delivery_date = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # A buyer's orders by status, newest first
+            models.Index(fields=["buyer", "status", "created_at"], name="order_buyer_status_idx"),
+            # A seller's orders are found through their listings
+            models.Index(fields=["listing", "status", "created_at"], name="order_listing_status_idx"),
+        ]
+
     def __str__(self):
         return f"{self.buyer} bought {self.listing} ({self.status})"
     
@@ -156,3 +322,21 @@ class Review(models.Model):
 
     def __str__(self):
         return f"{self.rating}⭐ by {self.user}"
+
+
+class SellerDailySales(models.Model):
+    # Orders on a seller's listings rolled up by the (local) day they were
+    # placed and their current status. Maintained by auctions.rollups as
+    # orders are created and change status.
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_sales")
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("seller", "day", "status")
+
+    def __str__(self):
+        return f"{self.seller} {self.day} {self.status}: {self.orders} orders, ${self.revenue}"
@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import CATALOG_VERSION_KEY, get_version
+
+PAGE_CACHE_TIMEOUT = 60
+
+
+def is_cacheable(request):
+    # Only anonymous GETs without pending messages share a cached page;
+    # anything personalized must come from the view itself.
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and "messages" not in request.COOKIES
+    )
+
+
+def anonymous_page_cache(etag_source=None):
+    """
+    Serve anonymous GETs from a short-lived shared page cache, answering
+    conditional requests with a 304 before the view runs.
+
+    The validators come from the catalog version, which is bumped whenever a
+    listing, bid, review or category changes; ``etag_source(request, *args,
+    **kwargs)`` can supply finer grained data for the ETag instead, or None to
+    skip caching. Cached pages are keyed on their ETag, so a change purges
+    them without an explicit delete.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ["Cookie"])
+                if request.user.is_authenticated:
+                    patch_cache_control(response, private=True)
+                return response
+
+            version = get_version(CATALOG_VERSION_KEY)
+            source = etag_source(request, *args, **kwargs) if etag_source else version
+            if source is None:
+                return view(request, *args, **kwargs)
+            digest = hashlib.md5(f"{request.get_full_path()}|{source}".encode()).hexdigest()
+            etag = quote_etag(digest)
+            last_modified = version // 10**9
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                key = f"page:{digest}"
+                response = cache.get(key)
+                if response is None:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.cookies and not response.streaming:
+                        cache.set(key, response, PAGE_CACHE_TIMEOUT)
+
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ["Cookie"])
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+            return response
+        return wrapper
+    return decorator
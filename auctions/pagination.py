@@ -0,0 +1,202 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import BadRequest, FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.http import QueryDict
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Set by paginate(): the request's query string and the prefix of
+        # this list's after/before parameters, so several paginated lists
+        # can share one page
+        self.query = QueryDict()
+        self.prefix = ""
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(before=self.previous_cursor)
+
+    def _url(self, **cursor):
+        query = self.query.copy()
+        for name in ("after", "before"):
+            query.pop(f"{self.prefix}{name}", None)
+        for name, value in cursor.items():
+            query[f"{self.prefix}{name}"] = value
+        return f"?{query.urlencode()}"
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a queryset ordered by ``ordering``, whose last
+    field must be unique (normally "pk"). A page is fetched with a range
+    condition on the ordering columns instead of an OFFSET, so every page
+    costs the same as the first when an index covers the ordering.
+
+    NULL sorts below every value, as SQLite has it: first ascending, last
+    descending. A cursor that can't be decoded or holds values of the wrong
+    type raises BadRequest.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        after = decode_cursor(after, len(self.ordering))
+        before = decode_cursor(before, len(self.ordering))
+        try:
+            return self._page(after, before)
+        except (ValidationError, ValueError, TypeError):
+            # The cursor decoded but holds values of the wrong type
+            raise BadRequest("Invalid page cursor.") from None
+
+    def _page(self, after, before):
+        if before is not None and after is None:
+            rows = list(
+                self.queryset.filter(self._seek(before, forward=False))
+                .order_by(*self._order_by(reverse_ordering(self.ordering)))[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset
+            if after is not None:
+                queryset = queryset.filter(self._seek(after, forward=True))
+            rows = list(queryset.order_by(*self._order_by(self.ordering))[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = after is not None
+
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor(rows[-1]) if has_next else None,
+            previous_cursor=self._cursor(rows[0]) if has_previous else None,
+        )
+
+    def _nullable(self, name):
+        if name == "pk":
+            return False
+        try:
+            return self.queryset.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            # An annotation, such as search_rank
+            return False
+
+    def _order_by(self, ordering):
+        # Nullable fields get their NULL placement spelled out, so it is the
+        # same on every backend and matches _seek
+        order_by = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if not self._nullable(name):
+                order_by.append(field)
+            elif field.startswith("-"):
+                order_by.append(F(name).desc(nulls_last=True))
+            else:
+                order_by.append(F(name).asc(nulls_first=True))
+        return order_by
+
+    def _seek(self, values, forward):
+        # (a, b, c) > (x, y, z) spelled out as
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        # with the comparison flipped for descending fields. The extra
+        # a >= x term lets SQLite turn the OR chain into an index range.
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            condition |= equal & self._beyond(name, value, upward=field.startswith("-") != forward)
+            equal &= Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+        first = self.ordering[0].lstrip("-")
+        upward = self.ordering[0].startswith("-") != forward
+        if values[0] is None:
+            return condition
+        hint = Q(**{f"{first}__{'gte' if upward else 'lte'}": values[0]})
+        if not upward and self._nullable(first):
+            hint |= Q(**{f"{first}__isnull": True})
+        return hint & condition
+
+    def _beyond(self, name, value, upward):
+        # Rows strictly above (or below) ``value`` in the order, NULL lowest
+        if upward:
+            return Q(**{f"{name}__isnull": False}) if value is None else Q(**{f"{name}__gt": value})
+        if value is None:
+            return Q(pk__in=[])
+        below = Q(**{f"{name}__lt": value})
+        return below | Q(**{f"{name}__isnull": True}) if self._nullable(name) else below
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, field.lstrip("-")) for field in self.ordering])
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+
+
+def encode_cursor(values):
+    values = [
+        value.isoformat() if isinstance(value, datetime.datetime)
+        else str(value) if isinstance(value, decimal.Decimal)
+        else value
+        for value in values
+    ]
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, ValueError):
+        raise BadRequest("Invalid page cursor.") from None
+    if not isinstance(values, list) or len(values) != length:
+        raise BadRequest("Invalid page cursor.")
+    return values
+
+
+def paginate(request, queryset, ordering=("-date_time", "-pk"), prefix=""):
+    page = KeysetPaginator(queryset, ordering).page(
+        after=request.GET.get(f"{prefix}after"),
+        before=request.GET.get(f"{prefix}before"),
+    )
+    page.query = request.GET
+    page.prefix = prefix
+    return page
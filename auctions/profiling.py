@@ -0,0 +1,203 @@
+"""
+Per-request profiling: SQL count and time, repeated statements, template
+render time and view time.
+
+ProfilingMiddleware samples a PROFILING_SAMPLE_RATE share of requests. For
+each sampled request a Profile is set in a context variable; the execute
+wrapper installed on every database connection and the timed template
+backend add to whatever profile is current, so unsampled requests cost one
+random() call and a context variable lookup per query. A sampled response
+gets a Server-Timing header, and a request that is slow, runs too many
+queries or repeats one statement too often (the signature of an N+1) is
+logged to "auctions.profiling" as one JSON line with its worst SQL.
+"""
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger("auctions.profiling")
+
+# Statements reported in a slow-request log line
+TOP_QUERIES = 5
+
+_profile = ContextVar("profile", default=None)
+
+
+class Profile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # SQL text with placeholders -> [executions, seconds]
+        self.queries = {}
+
+    def record_query(self, sql, elapsed):
+        entry = self.queries.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    @property
+    def query_count(self):
+        return sum(count for count, _ in self.queries.values())
+
+    @property
+    def query_time(self):
+        return sum(elapsed for _, elapsed in self.queries.values())
+
+    @property
+    def repeated(self):
+        # Executions beyond the first of each statement
+        return sum(count - 1 for count, _ in self.queries.values())
+
+    @property
+    def most_repeated(self):
+        return max((count for count, _ in self.queries.values()), default=0)
+
+    def top_queries(self, limit=TOP_QUERIES):
+        ranked = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"sql": sql[:300], "count": count, "ms": round(elapsed * 1000, 2)}
+            for sql, (count, elapsed) in ranked[:limit]
+        ]
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'db;dur={self.query_time * 1000:.1f};desc="{self.query_count} queries, {self.repeated} repeated"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"view;dur={self.view_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    # Execute wrapper installed on every connection
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        profile = _profile.get()
+        if profile is None:
+            return super().render(context, request)
+        # Templates rendered while another renders (such as cached
+        # fragments) are already inside its time
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - started
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the profile."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests; see the module docstring. Place it first in
+    MIDDLEWARE so the total covers the rest of the middleware too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = self.start()
+        if profile is None:
+            return self.get_response(request)
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(profile, request, response)
+
+    async def __acall__(self, request):
+        profile = self.start()
+        if profile is None:
+            return await self.get_response(request)
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(profile, request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _profile.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def start(self):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return Profile()
+
+    def finish(self, profile, request, response):
+        ended = time.perf_counter()
+        total = ended - profile.started
+        if profile.view_started is not None:
+            profile.view_time = ended - profile.view_started
+        response["Server-Timing"] = profile.server_timing(total)
+
+        if (
+            total * 1000 >= settings.PROFILING_SLOW_REQUEST_MS
+            or profile.query_count >= settings.PROFILING_MAX_QUERIES
+            or profile.most_repeated >= settings.PROFILING_MAX_REPEATS
+        ):
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 1),
+                "view_ms": round(profile.view_time * 1000, 1),
+                "template_ms": round(profile.template_time * 1000, 1),
+                "db_ms": round(profile.query_time * 1000, 1),
+                "queries": profile.query_count,
+                "repeated": profile.repeated,
+                "top_sql": profile.top_queries(),
+            }))
+        return response
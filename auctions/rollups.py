@@ -0,0 +1,100 @@
+"""
+Per-seller daily sales, kept in SellerDailySales.
+
+Each order counts once, in the row for its seller, the local day it was
+placed and its current status. The services that create orders or change
+their status call ``record_order`` / ``record_transition`` in the same
+transaction, so the rollups move with the orders and sales reports never
+have to scan Order. ``manage.py rebuild_sales_rollups`` recomputes them
+from the orders.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, SellerDailySales
+
+
+def record_order(order, seller_id):
+    record_transitions([(order, seller_id, None, order.status)])
+
+
+def record_transition(order, seller_id, old_status, new_status):
+    record_transitions([(order, seller_id, old_status, new_status)])
+
+
+def record_transitions(transitions):
+    """
+    Apply (order, seller id, old status, new status) moves, with old status
+    None for new orders. Moves landing on the same row are summed first, so
+    a bulk status change costs one write per affected row, not per order.
+    """
+    deltas = {}
+    for order, seller_id, old_status, new_status in transitions:
+        day = timezone.localdate(order.created_at)
+        revenue = order.price * order.quantity
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status is None:
+                continue
+            orders, units, total = deltas.get((seller_id, day, status), (0, 0, 0))
+            deltas[(seller_id, day, status)] = (
+                orders + sign, units + sign * order.quantity, total + sign * revenue
+            )
+    for (seller_id, day, status), (orders, units, revenue) in deltas.items():
+        if orders or units or revenue:
+            _apply({"seller_id": seller_id, "day": day, "status": status}, orders, units, revenue)
+
+
+def _apply(key, orders, units, revenue):
+    delta = {
+        "orders": F("orders") + orders,
+        "units": F("units") + units,
+        "revenue": F("revenue") + revenue,
+    }
+    if SellerDailySales.objects.filter(**key).update(**delta):
+        return
+    try:
+        with transaction.atomic():
+            SellerDailySales.objects.create(**key, orders=orders, units=units, revenue=revenue)
+    except IntegrityError:
+        # Another transaction created the row first
+        SellerDailySales.objects.filter(**key).update(**delta)
+
+
+def rollups_from_orders():
+    # Rows of SellerDailySales as recomputed from Order
+    return Order.objects.values(
+        seller_id=F("listing__creator"),
+        day=TruncDate("created_at"),
+        status_value=F("status"),
+    ).annotate(
+        order_count=Count("pk"),
+        unit_count=Sum("quantity"),
+        revenue_sum=Sum(ExpressionWrapper(
+            F("price") * F("quantity"), output_field=DecimalField(max_digits=14, decimal_places=2)
+        )),
+    ).order_by()
+
+
+def daily_summary(seller, days=30):
+    """
+    The seller's last ``days`` days from the rollups, newest first: orders,
+    units and revenue for orders that weren't cancelled, and cancellations.
+    """
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+    sold = ~Q(status=Order.CANCELLED)
+    cancelled = Q(status=Order.CANCELLED)
+    return (
+        SellerDailySales.objects.filter(seller=seller, day__gte=since)
+        .values("day")
+        .annotate(
+            orders_total=Sum("orders", filter=sold),
+            units_total=Sum("units", filter=sold),
+            revenue_total=Sum("revenue", filter=sold),
+            cancelled_total=Sum("orders", filter=cancelled),
+        )
+        .order_by("-day")
+    )
@@ -0,0 +1,155 @@
+"""
+Read replicas with read-your-writes.
+
+DATABASE_REPLICAS maps replica aliases in DATABASES to integer weights.
+ReplicaRouter sends the reads of a request to one replica, picked by smooth
+weighted round-robin (plain round-robin when the weights are equal), and all
+writes to the primary ("default"). A request reads from the primary instead
+when it is not GET or HEAD, once it has written anything, or while the
+client's REPLICA_PIN_COOKIE is live: ReplicaMiddleware sets that cookie for
+REPLICA_PIN_SECONDS after any request that wrote, so a user who just bid,
+bought or changed their watchlist sees it even if the replicas lag behind.
+
+Routing only applies inside requests; management commands and the
+close_auctions worker always use the primary.
+"""
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARY = "default"
+
+REPLICA_PIN_COOKIE = "primary_until"
+
+_routing = ContextVar("routing", default=None)
+
+_schedules = {}
+_schedules_lock = threading.Lock()
+
+
+def weighted_schedule(weights):
+    """
+    One round of smooth weighted round-robin over ``weights``: every alias
+    appears ``weight`` times, spread out rather than in runs.
+    """
+    total = sum(weights.values())
+    current = dict.fromkeys(weights, 0)
+    order = []
+    for _ in range(total):
+        for alias, weight in weights.items():
+            current[alias] += weight
+        alias = max(current, key=current.get)
+        current[alias] -= total
+        order.append(alias)
+    return order
+
+
+def next_replica():
+    weights = {alias: weight for alias, weight in settings.DATABASE_REPLICAS.items() if weight > 0}
+    if not weights:
+        return PRIMARY
+    key = tuple(weights.items())
+    with _schedules_lock:
+        if key not in _schedules:
+            _schedules[key] = itertools.cycle(weighted_schedule(weights))
+        return next(_schedules[key])
+
+
+class Routing:
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+    def read_alias(self):
+        if self.pinned or self.wrote:
+            return PRIMARY
+        # A request reads every page from the same replica, so it never
+        # mixes two replicas' points in time
+        if self.replica is None:
+            self.replica = next_replica()
+        return self.replica
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        return routing.read_alias() if routing is not None else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """
+    Route the request's reads (see the module docstring) and pin the client
+    to the primary after it writes. Place it before SessionMiddleware so a
+    session saved on login counts as a write.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.start(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(routing, response)
+
+    async def __acall__(self, request):
+        routing = self.start(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(routing, response)
+
+    def start(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return Routing(pinned=request.method not in ("GET", "HEAD") or pinned_until > time.time())
+
+    def finish(self, routing, response):
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            window = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                str(int(time.time() + window)),
+                max_age=window,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
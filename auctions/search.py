@@ -0,0 +1,111 @@
+"""
+Full-text search over listings.
+
+On SQLite the catalog is indexed in an FTS5 virtual table (created by
+migration 0013) holding each listing's title, description and category name,
+keyed by the listing id. The index is kept in sync by the signal handlers in
+auctions.signals and can be rebuilt with ``manage.py rebuild_search_index``.
+Other database backends fall back to a plain icontains filter.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Listing
+
+FTS_TABLE = "auctions_listing_fts"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Listing ids per statement, well under SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+INDEX_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, description, category)
+    SELECT l.id, l.title, l.description, COALESCE(c.name, '')
+    FROM auctions_listing l
+    LEFT JOIN auctions_category c ON c.id = l.category_id
+"""
+
+
+def is_available(using="default"):
+    return connections[using].vendor == "sqlite"
+
+
+def match_expression(text):
+    # Every word has to match, and the last one may be partially typed.
+    # Tokens are quoted so user input can't inject FTS5 query syntax.
+    tokens = TOKEN_RE.findall(text.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(queryset, text):
+    if not is_available(queryset.db):
+        return queryset.filter(
+            Q(title__icontains=text)
+            | Q(description__icontains=text)
+            | Q(category__name__icontains=text)
+        )
+
+    match = match_expression(text)
+    if not match:
+        return queryset.none()
+
+    # Join the index once: one MATCH finds the hits and scores them, where
+    # a rank subquery per row would run the MATCH again for every hit
+    table = Listing._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    ).annotate(
+        # bm25 score of the row; lower is a better match
+        search_rank=RawSQL(f"{FTS_TABLE}.rank", (), output_field=FloatField()),
+    ).order_by("search_rank", "pk")
+
+
+def index_listings(listing_ids, using="default"):
+    if not is_available(using):
+        return
+    listing_ids = list(listing_ids)
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(listing_ids), BATCH_SIZE):
+            batch = listing_ids[start:start + BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+            cursor.execute(f"{INDEX_SQL} WHERE l.id IN ({placeholders})", batch)
+
+
+def index_category(category_id, using="default"):
+    if not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+            "(SELECT id FROM auctions_listing WHERE category_id = %s)",
+            [category_id],
+        )
+        cursor.execute(f"{INDEX_SQL} WHERE l.category_id = %s", [category_id])
+
+
+def remove_listings(listing_ids, using="default"):
+    if not is_available(using):
+        return
+    listing_ids = list(listing_ids)
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(listing_ids), BATCH_SIZE):
+            batch = listing_ids[start:start + BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+
+
+def rebuild_index(using="default"):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(INDEX_SQL)
+        indexed = cursor.rowcount
+        # Merge the b-tree segments written by the bulk insert
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,375 @@
+"""
+Synthetic marketplace data for load testing.
+
+``Seeder`` generates buyers, sellers, categories, listings of both types,
+ascending bid sequences, watchlists, orders in every status and reviews,
+all from one random.Random, so a given seed, base time and set of options
+always produce the same marketplace. Users and categories go in with bulk_create;
+everything else is built a chunk of listings at a time as plain rows and
+written with executemany. Every denormalized value (listing bid and rating
+aggregates, effective prices, stock, settlements, sales rollups and the
+search index) is computed up front instead of through the services, which
+keeps the rate in the millions of rows per minute.
+"""
+import datetime
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import search
+from .cache import invalidate_catalog, invalidate_categories, invalidate_category_counts
+from .models import Bid, Category, Listing, Order, Review, SellerDailySales, User, Watchlist
+
+CATEGORY_NAMES = [
+    "Antiques", "Art", "Books", "Cameras", "Clothing", "Coins", "Collectibles", "Computers",
+    "Electronics", "Furniture", "Garden", "Jewelry", "Music", "Phones", "Sports", "Stamps",
+    "Tools", "Toys", "Video Games", "Watches",
+]
+
+ADJECTIVES = [
+    "vintage", "rare", "classic", "mint", "restored", "handmade", "signed", "sealed",
+    "refurbished", "limited", "original", "antique", "compact", "deluxe", "used", "new",
+]
+
+NOUNS = [
+    "camera", "lens", "watch", "guitar", "lamp", "chair", "novel", "poster", "console",
+    "record", "bicycle", "jacket", "ring", "clock", "radio", "painting", "keyboard", "phone",
+]
+
+REVIEW_COMMENTS = ["", "", "Great seller.", "As described.", "Fast shipping.", "Item arrived late.", "Would buy again."]
+
+# Star ratings 1-5, skewed towards good reviews as on real marketplaces
+RATING_WEIGHTS = [4, 4, 10, 30, 52]
+
+DEFAULT_ORDER_STATUSES = {Order.PENDING: 2, Order.PROCESSED: 2, Order.COMPLETED: 5, Order.CANCELLED: 1}
+
+CHUNK_SIZE = 5000
+
+# Every Listing column insert() writes, with the value a new listing starts with
+LISTING_DEFAULTS = {
+    "id": None, "title": "", "description": "", "listing_type": Listing.AUCTION, "starting_bid": None,
+    "buy_now_price": None, "image": "", "date_time": None, "category_id": None, "creator_id": None,
+    "active": True, "stock": 1, "highest_bid_amount": None, "highest_bidder_id": None, "bid_count": 0,
+    "rating_sum": 0, "rating_count": 0, "effective_price": None, "end_time": None, "winner_id": None,
+    "final_price": None, "version": 1, "updated_at": None,
+}
+
+# Listing columns that go through the backend's datetime adapter
+DATETIME_FIELDS = {"date_time", "end_time", "updated_at"}
+
+
+class SeedResult:
+
+    def __init__(self):
+        # Model name -> rows created
+        self.counts = {}
+
+    def add(self, model, rows):
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + rows
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+class Seeder:
+    """
+    Generate a marketplace. Counts and rates:
+
+    buyers, sellers, categories, listings
+        rows to create (categories that exist already are reused)
+    buy_now_share
+        fraction of listings that are Buy Now rather than auctions
+    closed_share
+        fraction of auctions that have ended and been settled
+    bids_per_auction, orders_per_listing, watchlists_per_buyer
+        means; the actual numbers are exponentially distributed, so a few
+        listings draw many bids or orders and most draw a handful
+    review_share
+        fraction of completed orders the buyer reviewed
+    order_statuses
+        {status: weight} for the status orders end up in
+    skew
+        Zipf exponent for how activity concentrates on the busiest sellers
+        and buyers (0 spreads it evenly)
+    days
+        how far back listings and orders are spread
+    now
+        the base time every timestamp is generated relative to (default:
+        the current time)
+    """
+
+    def __init__(
+        self, seed=0, prefix="seed", password="password", buyers=1000, sellers=100, categories=20,
+        listings=10000, buy_now_share=0.4, closed_share=0.3, bids_per_auction=8.0, orders_per_listing=3.0,
+        watchlists_per_buyer=5.0, review_share=0.4, order_statuses=None, skew=1.0, days=90,
+        batch_size=5000, chunk_size=CHUNK_SIZE, now=None,
+    ):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.password = password
+        self.buyers = buyers
+        self.sellers = sellers
+        self.categories = categories
+        self.listings = listings
+        self.buy_now_share = buy_now_share
+        self.closed_share = closed_share
+        self.bids_per_auction = bids_per_auction
+        self.orders_per_listing = orders_per_listing
+        self.watchlists_per_buyer = watchlists_per_buyer
+        self.review_share = review_share
+        self.order_statuses = order_statuses or DEFAULT_ORDER_STATUSES
+        self.skew = skew
+        self.days = days
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.now = now or timezone.now()
+        self.result = SeedResult()
+        # (seller id, local day, status) -> [orders, units, revenue]
+        self.rollups = {}
+
+    def run(self, progress=None):
+        """Seed everything; ``progress(result)`` is called after each chunk."""
+        if connection.vendor != "sqlite":
+            raise ValueError("Seeding reserves listing ids from SQLite's AUTOINCREMENT counter; use SQLite.")
+        if User.objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise ValueError(f"Users prefixed {self.prefix!r} already exist; pick another prefix.")
+        with transaction.atomic():
+            # One hash shared by every generated user; hashing per user
+            # would take far longer than the inserts
+            password = make_password(self.password)
+            self.seller_ids = self.create_users("seller", self.sellers, User.SELLER, password)
+            self.buyer_ids = self.create_users("buyer", self.buyers, User.BUYER, password)
+            self.category_ids = self.create_categories()
+        self.pick_seller = self.chooser(self.seller_ids)
+        self.pick_buyer = self.chooser(self.buyer_ids)
+        self.statuses = list(self.order_statuses)
+        self.status_weights = list(itertools.accumulate(self.order_statuses.values()))
+        self.watchers_per_listing = self.watchlists_per_buyer * self.buyers / max(self.listings, 1)
+
+        for start in range(0, self.listings, self.chunk_size):
+            with transaction.atomic():
+                self.create_chunk(min(self.chunk_size, self.listings - start))
+            if progress:
+                progress(self.result)
+        with transaction.atomic():
+            self.create_rollups()
+
+        invalidate_categories()
+        invalidate_catalog()
+        invalidate_category_counts()
+        return self.result
+
+    def bulk_create(self, model, rows):
+        created = model.objects.bulk_create(rows, batch_size=self.batch_size)
+        self.result.add(model, len(created))
+        return created
+
+    def create_users(self, name, count, role, password):
+        users = self.bulk_create(User, [
+            User(
+                username=f"{self.prefix}-{name}-{i}",
+                email=f"{self.prefix}-{name}-{i}@example.com",
+                password=password,
+                role=role,
+            )
+            for i in range(count)
+        ])
+        return [user.pk for user in users]
+
+    def create_categories(self):
+        names = CATEGORY_NAMES[:self.categories] + [
+            f"Category {i}" for i in range(len(CATEGORY_NAMES), self.categories)
+        ]
+        existing = dict(Category.objects.filter(name__in=names).values_list("name", "pk"))
+        created = self.bulk_create(Category, [Category(name=name) for name in names if name not in existing])
+        return sorted([*existing.values(), *(category.pk for category in created)])
+
+    def chooser(self, ids):
+        # Picks ids with Zipf weights, busiest first
+        weights = list(itertools.accumulate(1 / (rank + 1) ** self.skew for rank in range(len(ids))))
+        return lambda: self.rng.choices(ids, cum_weights=weights)[0]
+
+    def amount(self, mean):
+        # Exponentially distributed count with the given mean, rounded at
+        # random so small means aren't rounded away
+        if mean <= 0:
+            return 0
+        value = self.rng.expovariate(1 / mean)
+        return int(value) + (self.rng.random() < value % 1)
+
+    def moment(self, start, end=None):
+        # A random time between start and end (default now)
+        end = end or self.now
+        return start + (end - start) * self.rng.random()
+
+    def create_chunk(self, count):
+        rng = self.rng
+        first_id = self.reserve_listing_ids(count)
+        listings, bids, orders, reviews, watchlists = [], [], [], [], []
+        for pk in range(first_id, first_id + count):
+            created = self.now - datetime.timedelta(days=self.days) * rng.random()
+            seller_id = self.pick_seller()
+            listing = dict(
+                LISTING_DEFAULTS,
+                id=pk,
+                title=f"{rng.choice(ADJECTIVES).title()} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+                description=f"A {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} in {rng.choice(ADJECTIVES)} condition.",
+                creator_id=seller_id,
+                category_id=rng.choice(self.category_ids) if self.category_ids else None,
+                date_time=created,
+                updated_at=created,
+            )
+            if rng.random() < self.buy_now_share:
+                listing_bids, listing_orders = self.plan_buy_now(listing, seller_id, created)
+            else:
+                listing_bids, listing_orders = self.plan_auction(listing, seller_id, created)
+
+            # Child rows are plain tuples with the listing id in front
+            bids.extend((pk, *row) for row in listing_bids)
+            orders.extend((pk, *row) for row in listing_orders)
+            reviews.extend((pk, *row) for row in self.plan_reviews(listing, listing_orders))
+            watchers = min(self.amount(self.watchers_per_listing), len(self.buyer_ids))
+            watchlists.extend((pk, user_id) for user_id in rng.sample(self.buyer_ids, watchers))
+            listings.append(tuple(
+                self.db_datetime(listing[name]) if name in DATETIME_FIELDS and listing[name] else listing[name]
+                for name in LISTING_DEFAULTS
+            ))
+
+        self.insert(Listing, list(LISTING_DEFAULTS), listings)
+        search.index_listings(range(first_id, first_id + count))
+        self.insert(Bid, ["listing", "bidder", "amount"], bids)
+        self.insert(Order, ["listing", "buyer", "price", "quantity", "status", "created_at", "delivery_date"], orders)
+        self.insert(Review, ["listing", "user", "rating", "comment", "created_at"], reviews)
+        self.insert(Watchlist, ["listing", "user"], watchlists)
+
+    def reserve_listing_ids(self, count):
+        # Listing ids are assigned here so child rows can refer to them
+        # without reading the listings back. They come from the AUTOINCREMENT
+        # counter, not the largest id left, so the ids of deleted listings
+        # are never handed out again: cached fragments are keyed by
+        # (pk, version) and search index rows by id. The chunk's transaction
+        # keeps other writers out until it commits.
+        table = Listing._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            row = cursor.fetchone()
+            last = max(row[0] if row else 0, Listing.objects.aggregate(last=Max("pk"))["last"] or 0)
+            if row:
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [last + count, table])
+            else:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, last + count])
+        return last + 1
+
+    def insert(self, model, fields, rows):
+        # bulk_create spends far more time building and compiling model
+        # instances than SQLite spends inserting them, so the bulk of the
+        # data goes in as prepared rows with one executemany per table
+        meta = model._meta
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(meta.get_field(name).column) for name in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES ({placeholders})", rows)
+        self.result.add(model, len(rows))
+
+    def plan_auction(self, listing, seller_id, created):
+        # Fills in the auction's fields; returns its bids and orders
+        rng = self.rng
+        cents = rng.randint(5, 500) * 100
+        listing["listing_type"] = Listing.AUCTION
+        listing["starting_bid"] = listing["effective_price"] = cents_to_decimal(cents)
+        bids = []
+        bidder = None
+        for _ in range(self.amount(self.bids_per_auction)):
+            # Nobody outbids themselves; each bid beats the last by 1-10%
+            candidate = self.pick_buyer()
+            if candidate == bidder:
+                continue
+            if bids:
+                cents += max(100, int(cents * rng.uniform(0.01, 0.1)))
+            bidder = candidate
+            bids.append((bidder, cents_to_decimal(cents)))
+        listing["bid_count"] = len(bids)
+        if bids:
+            listing["highest_bid_amount"] = listing["effective_price"] = bids[-1][1]
+            listing["highest_bidder_id"] = bidder
+
+        orders = []
+        if rng.random() < self.closed_share:
+            listing["active"] = False
+            listing["end_time"] = listing["updated_at"] = self.moment(created)
+            if bids:
+                listing["winner_id"] = bidder
+                listing["final_price"] = listing["highest_bid_amount"]
+                orders.append(self.order(seller_id, bidder, listing["final_price"], 1, listing["end_time"]))
+        elif rng.random() < 0.5:
+            listing["end_time"] = self.now + datetime.timedelta(hours=rng.randint(1, 14 * 24))
+        return bids, orders
+
+    def plan_buy_now(self, listing, seller_id, created):
+        rng = self.rng
+        price = cents_to_decimal(rng.randint(500, 80000))
+        listing["listing_type"] = Listing.BUY_NOW
+        listing["buy_now_price"] = listing["effective_price"] = price
+        orders = []
+        for _ in range(self.amount(self.orders_per_listing)):
+            quantity = rng.choice((1, 1, 1, 2, 3))
+            placed = self.moment(created)
+            listing["updated_at"] = max(listing["updated_at"], placed)
+            orders.append(self.order(seller_id, self.pick_buyer(), price, quantity, placed))
+        # What's left in stock; a few listings have sold out
+        listing["stock"] = 0 if rng.random() < 0.05 else rng.randint(1, 50)
+        listing["active"] = listing["stock"] > 0
+        return [], orders
+
+    def plan_reviews(self, listing, orders):
+        # At most one review per buyer, for completed orders only; the
+        # listing's rating aggregates are set to match
+        reviews = []
+        reviewers = set()
+        for buyer_id, _, _, status, _, delivered in orders:
+            if status != Order.COMPLETED or buyer_id in reviewers or self.rng.random() >= self.review_share:
+                continue
+            reviewers.add(buyer_id)
+            rating = self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+            reviews.append((buyer_id, rating, self.rng.choice(REVIEW_COMMENTS), delivered))
+            listing["rating_sum"] += rating
+            listing["rating_count"] += 1
+        return reviews
+
+    def order(self, seller_id, buyer_id, price, quantity, created):
+        # One order row (without the listing id) in the columns of insert()
+        status = self.rng.choices(self.statuses, cum_weights=self.status_weights)[0]
+        delivery_date = None
+        if status in (Order.PROCESSED, Order.COMPLETED):
+            delivery_date = created + datetime.timedelta(days=self.rng.randint(1, 10))
+            if status == Order.COMPLETED:
+                delivery_date = min(delivery_date, self.now)
+        key = (seller_id, timezone.localdate(created), status)
+        rollup = self.rollups.setdefault(key, [0, 0, 0])
+        rollup[0] += 1
+        rollup[1] += quantity
+        rollup[2] += price * quantity
+        return (
+            buyer_id, price, quantity, status,
+            self.db_datetime(created), delivery_date and self.db_datetime(delivery_date),
+        )
+
+    def db_datetime(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def create_rollups(self):
+        # The sellers are new, so their rollup rows can simply be inserted
+        self.insert(SellerDailySales, ["seller", "day", "status", "orders", "units", "revenue"], [
+            (seller_id, day, status, *totals) for (seller_id, day, status), totals in self.rollups.items()
+        ])
+
+
+def cents_to_decimal(cents):
+    return Decimal(cents).scaleb(-2)
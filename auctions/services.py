@@ -0,0 +1,370 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from . import events, rollups
+from .cache import invalidate_catalog, invalidate_category_counts
+from .models import Bid, Listing, Order
+
+
+class BidRejected(Exception):
+    pass
+
+
+def place_bid(listing, bidder, amount):
+    """
+    Place a bid of ``amount`` on ``listing`` or raise BidRejected.
+
+    The listing's stored high bid is advanced with a compare-and-swap UPDATE
+    that only matches while the bid still beats it, so concurrent bidders
+    can't both win and a losing bid costs one statement. The Bid row is
+    inserted in the same transaction.
+    """
+    beats_current = (
+        Q(highest_bid_amount__lt=amount)
+        | Q(highest_bid_amount__isnull=True, starting_bid__lte=amount)
+    )
+    with transaction.atomic():
+        accepted = Listing.objects.filter(
+            beats_current,
+            still_open(),
+            pk=listing.pk,
+            active=True,
+            listing_type=Listing.AUCTION,
+        ).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            bid_count=F("bid_count") + 1,
+            highest_bidder=bidder,
+            highest_bid_amount=amount,
+            effective_price=amount,
+        )
+        if not accepted:
+            raise BidRejected(rejection_reason(listing, amount))
+        bid = Bid.objects.create(listing=listing, bidder=bidder, amount=amount)
+        invalidate_catalog()
+        publish(listing.pk, {
+            "type": "bid",
+            "highest_bid": str(amount),
+            "bid_count": Listing.objects.filter(pk=listing.pk).values_list("bid_count", flat=True).get(),
+        })
+    return bid
+
+
+def still_open():
+    # An auction past its end time takes no more bids, even before the
+    # close_auctions worker has got round to closing it
+    return Q(end_time__isnull=True) | Q(end_time__gt=timezone.now())
+
+
+def rejection_reason(listing, amount):
+    # Worded from the caller's copy of the listing; when the CAS lost a race
+    # that copy is simply older than the bid that beat it
+    if not listing.active:
+        return "This listing is no longer active."
+    if listing.end_time and listing.end_time <= timezone.now():
+        return "This auction has ended."
+    if listing.highest_bid_amount is None and amount < listing.starting_bid:
+        return "Your bid must be greater than the Starting Bid"
+    return "Your bid must be greater than current Highest Bid"
+
+
+def close_listing(listing):
+    """
+    Close ``listing`` and, for an auction with bids, settle it: the highest
+    bidder becomes the winner at their bid and gets a pending Order. Returns
+    False if the listing was already closed.
+
+    Closing is a conditional UPDATE on active, so the seller and the
+    close_auctions worker racing to close the same auction settle it once.
+    """
+    with transaction.atomic():
+        closed = Listing.objects.filter(pk=listing.pk, active=True).update(
+            active=False,
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            winner=F("highest_bidder"),
+            final_price=F("highest_bid_amount"),
+        )
+        if not closed:
+            return False
+        settled = Listing.objects.filter(
+            pk=listing.pk, listing_type=Listing.AUCTION, winner__isnull=False
+        ).values_list("creator", "winner", "winner__username", "final_price").first()
+        winner = final_price = None
+        if settled:
+            seller_id, winner_id, winner, final_price = settled
+            order = Order.objects.create(
+                buyer_id=winner_id,
+                listing_id=listing.pk,
+                price=final_price,
+                status=Order.PENDING,
+            )
+            rollups.record_order(order, seller_id)
+        invalidate_catalog()
+        publish(listing.pk, {
+            "type": "closed",
+            "winner": winner,
+            "final_price": None if final_price is None else str(final_price),
+        })
+        invalidate_category_counts()
+    return True
+
+
+def close_expired_auctions(batch_size=100):
+    """
+    Close up to ``batch_size`` auctions whose end time has passed, oldest
+    first, in one transaction. Returns the number closed.
+    """
+    expired = Listing.objects.filter(
+        active=True,
+        listing_type=Listing.AUCTION,
+        end_time__lte=timezone.now(),
+    ).order_by("end_time", "id")
+    closed = 0
+    with transaction.atomic():
+        for listing in expired.only("pk")[:batch_size]:
+            closed += close_listing(listing)
+    return closed
+
+
+class PurchaseRejected(Exception):
+    pass
+
+
+def buy_now(listing, buyer, quantity):
+    """
+    Buy ``quantity`` units of a Buy Now listing or raise PurchaseRejected.
+
+    Stock is taken with one conditional UPDATE (stock = stock - n WHERE
+    stock >= n) that also deactivates the listing when it sells out, and the
+    order is inserted in the same transaction, so concurrent buyers can never
+    take more than is in stock.
+    """
+    if quantity < 1:
+        raise PurchaseRejected("Invalid quantity.")
+    with transaction.atomic():
+        bought = Listing.objects.filter(
+            pk=listing.pk,
+            active=True,
+            listing_type=Listing.BUY_NOW,
+            stock__gte=quantity,
+        ).exclude(creator=buyer).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            stock=F("stock") - quantity,
+            # SET expressions see the row as it was before the update
+            active=Case(When(stock=quantity, then=Value(False)), default=Value(True)),
+        )
+        if not bought:
+            raise PurchaseRejected(purchase_rejection_reason(listing, buyer, quantity))
+        order = Order.objects.create(
+            buyer=buyer,
+            listing=listing,
+            price=listing.buy_now_price,
+            quantity=quantity,
+            status=Order.PENDING,
+        )
+        rollups.record_order(order, listing.creator_id)
+        invalidate_catalog()
+        invalidate_category_counts()
+        publish_stock(listing.pk)
+    return order
+
+
+def purchase_rejection_reason(listing, buyer, quantity):
+    if listing.listing_type != Listing.BUY_NOW:
+        return "This item is not available for direct purchase."
+    if not listing.active:
+        return "This listing is no longer active."
+    if listing.creator_id == buyer.pk:
+        return "You cannot buy your own listing."
+    if listing.stock <= 0:
+        return "This item is out of stock."
+    if quantity > listing.stock:
+        return "Invalid quantity."
+    # Other buyers got there first
+    return "Not enough stock left for that quantity."
+
+
+def process_order(order, delivery_date):
+    """
+    Mark a pending ``order`` as processed with its expected delivery date.
+    Returns False if it is no longer pending.
+    """
+    with transaction.atomic():
+        processed = Order.objects.filter(pk=order.pk, status=Order.PENDING).update(
+            status=Order.PROCESSED,
+            delivery_date=delivery_date,
+        )
+        if not processed:
+            return False
+        rollups.record_transition(order, order.listing.creator_id, Order.PENDING, Order.PROCESSED)
+    order.status = Order.PROCESSED
+    order.delivery_date = delivery_date
+    return True
+
+
+def complete_order(order):
+    """
+    Mark a processed ``order`` whose delivery date has passed as completed.
+    Returns False if it can't be completed (yet).
+    """
+    with transaction.atomic():
+        completed = Order.objects.filter(
+            pk=order.pk, status=Order.PROCESSED, delivery_date__lte=timezone.now()
+        ).update(status=Order.COMPLETED)
+        if not completed:
+            return False
+        rollups.record_transition(order, order.listing.creator_id, Order.PROCESSED, Order.COMPLETED)
+    order.status = Order.COMPLETED
+    return True
+
+
+def cancel_order(order):
+    """
+    Cancel ``order`` and put its quantity back in stock. Returns False if the
+    order can no longer be cancelled.
+
+    Pending orders can always be cancelled, processed ones until their
+    delivery date. The status change is conditional on those rules, so two
+    cancellations of the same order can't both restock it.
+    """
+    cancellable = [
+        (Order.PENDING, Q()),
+        (Order.PROCESSED, Q(delivery_date__gt=timezone.now())),
+    ]
+    with transaction.atomic():
+        for status, condition in cancellable:
+            if Order.objects.filter(condition, pk=order.pk, status=status).update(status=Order.CANCELLED):
+                break
+        else:
+            return False
+        rollups.record_transition(order, order.listing.creator_id, status, Order.CANCELLED)
+        Listing.objects.filter(pk=order.listing_id).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            stock=F("stock") + order.quantity,
+        )
+        invalidate_catalog()
+        publish_stock(order.listing_id)
+    order.status = Order.CANCELLED
+    return True
+
+
+def process_orders(seller, order_ids, delivery_date):
+    """
+    Process every pending order among ``order_ids`` on ``seller``'s
+    listings with one delivery date. Orders that aren't the seller's or
+    aren't pending are skipped. Returns the number processed.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, listing__creator=seller, status=Order.PENDING)
+            .only("pk", "created_at", "price", "quantity")
+        )
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            status=Order.PROCESSED,
+            delivery_date=delivery_date,
+        )
+        rollups.record_transitions(
+            (order, seller.pk, Order.PENDING, Order.PROCESSED) for order in orders
+        )
+    return len(orders)
+
+
+def cancel_orders(seller, order_ids):
+    """
+    Cancel the cancellable orders among ``order_ids`` on ``seller``'s
+    listings and restock them. Returns the number cancelled.
+    """
+    cancellable = Q(status=Order.PENDING) | Q(status=Order.PROCESSED, delivery_date__gt=timezone.now())
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(cancellable, pk__in=order_ids, listing__creator=seller)
+            .only("pk", "listing_id", "status", "created_at", "price", "quantity")
+        )
+        if not orders:
+            return 0
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(status=Order.CANCELLED)
+        rollups.record_transitions(
+            (order, seller.pk, order.status, Order.CANCELLED) for order in orders
+        )
+        restock = {}
+        for order in orders:
+            restock[order.listing_id] = restock.get(order.listing_id, 0) + order.quantity
+        Listing.objects.filter(pk__in=restock).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            stock=F("stock") + Case(*(When(pk=pk, then=Value(quantity)) for pk, quantity in restock.items())),
+        )
+        invalidate_catalog()
+        publish_stocks(restock)
+    return len(orders)
+
+
+def update_stock(seller, stock_by_listing):
+    """
+    Set the stock of several of ``seller``'s Buy Now listings in one UPDATE,
+    from {listing id: (stock as shown to the seller, new stock)}. A listing is
+    only written while it still holds the stock it was shown with, so units
+    sold since the page loaded are never overwritten. Listings that aren't
+    the seller's, aren't Buy Now or keep their stock are left alone.
+
+    Returns the number of listings changed and the ids of those skipped
+    because their stock had moved on.
+    """
+    changes = {pk: new for pk, (shown, new) in stock_by_listing.items() if new != shown}
+    if not changes:
+        return 0, []
+    shown = {pk: stock_by_listing[pk][0] for pk in changes}
+    with transaction.atomic():
+        owned = Listing.objects.filter(pk__in=changes, creator=seller, listing_type=Listing.BUY_NOW)
+        current = dict(owned.select_for_update().values_list("pk", "stock"))
+        listing_ids = [pk for pk, stock in current.items() if stock == shown[pk]]
+        stale = sorted(pk for pk, stock in current.items() if stock != shown[pk])
+        if not listing_ids:
+            return 0, stale
+        updated = Listing.objects.filter(
+            pk__in=listing_ids,
+            stock=Case(*(When(pk=pk, then=Value(shown[pk])) for pk in listing_ids)),
+        ).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            stock=Case(*(When(pk=pk, then=Value(changes[pk])) for pk in listing_ids)),
+        )
+        invalidate_catalog()
+        publish_stocks(listing_ids)
+    return updated, stale
+
+
+def publish(listing_id, event):
+    # Watchers only hear about writes that commit
+    transaction.on_commit(partial(events.publish, listing_id, event))
+
+
+def publish_stock(listing_id):
+    stock, active = Listing.objects.filter(pk=listing_id).values_list("stock", "active").get()
+    publish(listing_id, {"type": "stock", "stock": stock, "active": active})
+
+
+def publish_stocks(listing_ids):
+    for pk, stock, active in Listing.objects.filter(pk__in=listing_ids).values_list("pk", "stock", "active"):
+        publish(pk, {"type": "stock", "stock": stock, "active": active})
+
+
+def add_review(review):
+    with transaction.atomic():
+        review.save()
+        Listing.objects.filter(pk=review.listing_id).update(
+            version=F("version") + 1,
+            updated_at=timezone.now(),
+            rating_sum=F("rating_sum") + review.rating,
+            rating_count=F("rating_count") + 1,
+        )
+        invalidate_catalog()
+    return review
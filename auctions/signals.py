@@ -0,0 +1,77 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search
+from .cache import (
+    invalidate_catalog,
+    invalidate_categories,
+    invalidate_category_counts,
+    invalidate_watchlist_count,
+)
+from .models import Category, Comment, Listing, Watchlist
+
+
+# Keep the full-text index in step with listing and category changes
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, using, **kwargs):
+    search.index_listings([instance.pk], using=using)
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, using, **kwargs):
+    search.remove_listings([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, using, **kwargs):
+    if not created:
+        search.index_category(instance.pk, using=using)
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_listings(sender, instance, **kwargs):
+    # Listings lose their category through SET_NULL, so note them beforehand
+    instance._listing_ids = list(instance.listing_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_category_listings(sender, instance, using, **kwargs):
+    search.index_listings(getattr(instance, "_listing_ids", []), using=using)
+
+
+# Watchlist rows can also go away through cascades, not just toggle_watchlist
+
+@receiver(post_save, sender=Watchlist)
+@receiver(post_delete, sender=Watchlist)
+def watchlist_changed(sender, instance, **kwargs):
+    invalidate_watchlist_count(instance.user_id)
+
+
+# Bump the versions of the cached category list and per-category counts
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    invalidate_categories()
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def listing_changed(sender, **kwargs):
+    invalidate_category_counts()
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # Comments show on the listing page, whose cached copy follows its version
+    Listing.objects.filter(pk=instance.listing_id).update(
+        version=F("version") + 1,
+        updated_at=timezone.now(),
+    )
+    invalidate_catalog()
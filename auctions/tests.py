@@ -1,3 +1,821 @@
-from django.test import TestCase
+"""
+Query and latency budgets for every view.
 
-# Create your tests here.
+Each case requests one URL as an anonymous visitor, a buyer, a seller or
+staff, first on a small marketplace and again after it has grown several
+times over. The number of queries must not change between the two (a view
+whose query count follows the number of rows has an N+1) and must stay
+within the case's ceiling. Requests run against a cold cache, so the
+ceilings include the queries that fill it.
+
+Timings from the grown marketplace are checked against a generous latency
+budget and, when PERF_BASELINES names a file, written there as JSON to
+compare runs.
+"""
+import codecs
+import io
+import json
+import os
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+
+from django.core.cache import cache
+from django.core.exceptions import BadRequest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import imports, rollups, search, seeding, services, urls
+from .pagination import KeysetPaginator, encode_cursor
+from .profiling import ProfilingMiddleware
+from .routers import REPLICA_PIN_COOKIE, ReplicaMiddleware
+from .models import Category, Comment, Listing, Order, Review, SellerDailySales, User, Watchlist
+
+# Growth rounds seeded before the first and the second measurement
+SMALL = 2
+LARGE = 10
+
+# Seconds any one request may take on the grown marketplace
+LATENCY_BUDGET = float(os.environ.get("PERF_LATENCY_BUDGET", "1.0"))
+
+# URL names the suite doesn't request: the event stream never ends, and its
+# only query is the existence check on the listing
+UNMEASURED = {"listing_events"}
+
+
+def private_cache(name):
+    # A cache of the test class's own, emptied in setUp, so fragments keyed
+    # on (pk, version) never cross between test classes or test databases
+    return {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": name}}
+
+
+class Case:
+
+    def __init__(self, url, user, ceiling, method="get", path=None, data=None, variant=""):
+        # The URL name, who requests it and its query ceiling. ``path`` and
+        # ``data`` are called with the test case before each measurement
+        # (outside the query capture), so they can set up whatever the
+        # request consumes; ``path`` defaults to the URL without arguments.
+        # ``variant`` tells apart cases of the same URL, method and user.
+        self.url = url
+        self.variant = variant
+        self.user = user
+        self.ceiling = ceiling
+        self.method = method
+        self.path = path or (lambda test: reverse(url))
+        self.data = data
+
+    def __str__(self):
+        url = f"{self.url} ({self.variant})" if self.variant else self.url
+        return f"{self.method.upper()} {url} as {self.user}"
+
+
+def listing_path(name, kind="auction"):
+    return lambda test: reverse(name, args=[test.fresh_listing(kind).pk])
+
+
+def order_path(name, status=Order.PENDING):
+    return lambda test: reverse(name, args=[test.fresh_order(status).pk])
+
+
+CASES = [
+    Case("index", "anonymous", 2),
+    Case("index", "buyer", 5),
+    Case("index", "anonymous", 2, path=lambda test: reverse("index") + "?q=item&sort=price_asc",
+         variant="search"),
+    Case("index", "anonymous", 2, path=lambda test: f"{reverse('index')}?category={test.category.pk}&min_price=1",
+         variant="filtered"),
+    Case("login", "anonymous", 0),
+    Case("login", "anonymous", 9, method="post", data=lambda test: {"username": "buyer", "password": "secret"}),
+    Case("logout", "buyer", 4),
+    Case("register", "anonymous", 0),
+    Case("register", "anonymous", 10, method="post", data=lambda test: test.new_account()),
+    Case("create_listing", "seller", 4),
+    Case("create_listing", "seller", 7, method="post", data=lambda test: {
+        "title": "New item", "description": "Fresh stock", "listing_type": Listing.BUY_NOW,
+        "buy_now_price": "12", "stock": "3", "category": test.category.pk,
+    }),
+    Case("import_listings", "seller", 3),
+    Case("import_listings", "seller", 9, method="post", data=lambda test: {"file": test.import_file()}),
+    # The showcase listing gathers reviews and comments as the data grows
+    Case("listing", "anonymous", 6, path=lambda test: reverse("listing", args=[test.showcase.pk])),
+    Case("listing", "buyer", 9, path=lambda test: reverse("listing", args=[test.showcase.pk])),
+    Case("listing", "buyer", 8, method="post", path=listing_path("listing"), data=lambda test: {"amount": "500"}),
+    Case("close_listing", "seller", 7, method="post", path=listing_path("close_listing")),
+    Case("add_review", "buyer", 9, method="post",
+         path=lambda test: reverse("add_review", args=[test.fresh_order().listing_id]), data=lambda test: {"rating": 5}),
+    Case("toggle_watchlist", "buyer", 5, path=listing_path("toggle_watchlist")),
+    Case("watchlist", "buyer", 5),
+    Case("purchased_items", "buyer", 9),
+    Case("auctioned_listings", "buyer", 6),
+    Case("categories", "anonymous", 2),
+    Case("category", "anonymous", 2, path=lambda test: reverse("category", args=[test.category.name])),
+    Case("become_seller", "new buyer", 3, method="post"),
+    Case("buy_now", "buyer", 9, method="post", path=listing_path("buy_now", "buy_now"), data=lambda test: {"quantity": 1}),
+    *(
+        Case("seller_dashboard", "seller", 7, path=lambda test, tab=tab: f"{reverse('seller_dashboard')}?tab={tab}",
+             variant=tab)
+        for tab in ["listings", Order.PENDING, Order.PROCESSED, Order.COMPLETED, Order.CANCELLED]
+    ),
+    Case("seller_sales", "seller", 3),
+    Case("bulk_orders", "seller", 8, method="post", variant="process", data=lambda test: {
+        "action": "process", "delivery_date": "2030-01-01T12:00",
+        "order": [test.fresh_order().pk, test.fresh_order().pk],
+    }),
+    Case("bulk_orders", "seller", 10, method="post", variant="cancel", data=lambda test: {
+        "action": "cancel", "order": [test.fresh_order().pk, test.fresh_order().pk],
+    }),
+    # Every Buy Now listing the seller has, so the request grows with the data
+    Case("bulk_stock", "seller", 7, method="post", data=lambda test: {
+        field: value
+        for pk, stock in test.seller.listings.filter(listing_type=Listing.BUY_NOW).values_list("pk", "stock")
+        for field, value in [(f"stock-{pk}", stock + 1), (f"stock-orig-{pk}", stock)]
+    }),
+    Case("update_listing", "seller", 7, method="post", path=listing_path("update_listing", "buy_now"),
+         data=lambda test: {"action": "update_stock", "stock": "9"}),
+    Case("process_order", "seller", 8, method="post", path=order_path("process_order"),
+         data=lambda test: {"delivery_date": "2030-01-01T12:00"}),
+    Case("cancel_order", "buyer", 10, method="post", path=order_path("cancel_order")),
+    Case("complete_order", "buyer", 8, method="post", path=order_path("complete_order", Order.PROCESSED)),
+    *(
+        Case("export", "staff", 3, path=lambda test, kind=kind: reverse("export", args=[kind]), variant=kind)
+        for kind in ["listings", "bids", "orders"]
+    ),
+]
+
+
+@override_settings(
+    CACHES=private_cache("perf-tests"),
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+# Queries are counted on the primary
+@override_settings(DATABASE_REPLICAS={})
+class ViewBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", "seller@example.com", "secret", role=User.SELLER)
+        cls.other_seller = User.objects.create_user("other", "other@example.com", "secret", role=User.SELLER)
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "secret")
+        cls.rival = User.objects.create_user("rival", "rival@example.com", "secret")
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "secret", is_staff=True)
+        cls.category = Category.objects.create(name="Cameras")
+        Category.objects.create(name="Books")
+        cls.showcase = Listing.objects.create(
+            title="Showcase camera", description="A camera item", creator=cls.seller,
+            category=cls.category, starting_bid=Decimal("10"),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.rounds = 0
+        self.accounts = 0
+
+    def grow(self, rounds):
+        # Each round adds open, won and lost auctions, Buy Now listings,
+        # orders in every status and the buyer's watchlist, comments and
+        # reviews, split between two sellers, and a review and a comment
+        # from a new user on the showcase listing
+        for _ in range(rounds):
+            self.rounds += 1
+            reviewer = User.objects.create_user(f"reviewer{self.rounds}")
+            services.add_review(Review(user=reviewer, listing=self.showcase, rating=5, comment="Works well"))
+            Comment.objects.create(user=reviewer, listing=self.showcase, comment="Does it ship abroad?")
+            for seller in (self.seller, self.other_seller):
+                auction = self.fresh_listing("auction", seller)
+                services.place_bid(auction, self.rival, Decimal("20"))
+                services.place_bid(auction, self.buyer, Decimal("25"))
+                Watchlist.objects.create(user=self.buyer, listing=auction)
+                Comment.objects.create(user=self.rival, listing=auction, comment="Still available?")
+
+                for winner, loser in ((self.buyer, self.rival), (self.rival, self.buyer)):
+                    closed = self.fresh_listing("auction", seller)
+                    services.place_bid(closed, loser, Decimal("15"))
+                    services.place_bid(closed, winner, Decimal("30"))
+                    services.close_listing(closed)
+
+                for status in (Order.PENDING, Order.PROCESSED, Order.COMPLETED, Order.CANCELLED):
+                    order = self.fresh_order(status, seller)
+                    services.add_review(Review(user=self.buyer, listing=order.listing, rating=4))
+
+    def fresh_listing(self, kind="auction", seller=None):
+        self.rounds += 1
+        if kind == "auction":
+            return Listing.objects.create(
+                title=f"Camera {self.rounds}", description="A camera item", creator=seller or self.seller,
+                category=self.category, starting_bid=Decimal("10"),
+            )
+        return Listing.objects.create(
+            title=f"Lens {self.rounds}", description="A lens item", creator=seller or self.seller,
+            category=self.category, listing_type=Listing.BUY_NOW, buy_now_price=Decimal("40"), stock=50,
+        )
+
+    def fresh_order(self, status=Order.PENDING, seller=None):
+        order = services.buy_now(self.fresh_listing("buy_now", seller), self.buyer, 2)
+        if status == Order.PROCESSED:
+            services.process_order(order, timezone.now() - timedelta(days=1))
+        elif status == Order.COMPLETED:
+            services.process_order(order, timezone.now() - timedelta(days=1))
+            services.complete_order(order)
+        elif status == Order.CANCELLED:
+            services.cancel_order(order)
+        return order
+
+    def new_account(self):
+        self.accounts += 1
+        name = f"newcomer{self.accounts}"
+        return {"username": name, "email": f"{name}@example.com", "password": "secret", "confirmation": "secret"}
+
+    def import_file(self):
+        rows = "".join(f"Tripod {i},Sturdy,buy_now,,15,4,,,Cameras\n" for i in range(5))
+        return SimpleUploadedFile("listings.csv", ("title,description,listing_type,starting_bid,buy_now_price,stock,end_time,image,category\n" + rows).encode())
+
+    def measure(self, case):
+        # (query count, seconds) for one request of ``case``
+        self.client.logout()
+        if case.user == "new buyer":
+            self.client.force_login(User.objects.create_user(f"buyer{self.rounds}-{self.accounts}"))
+            self.accounts += 1
+        elif case.user != "anonymous":
+            self.client.force_login(getattr(self, case.user))
+        path = case.path(self)
+        data = case.data(self) if case.data else None
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, case.method)(path, data)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        self.assertLess(response.status_code, 400, f"{case}: {response.status_code}")
+        return len(queries), elapsed
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        measured = {case.url for case in CASES}
+        self.assertEqual(names - measured - UNMEASURED, set())
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self.grow(SMALL)
+        small = [self.measure(case)[0] for case in CASES]
+        self.grow(LARGE - SMALL)
+        timings = {}
+        for case, before in zip(CASES, small):
+            with self.subTest(str(case)):
+                queries, elapsed = self.measure(case)
+                timings[str(case)] = round(elapsed * 1000, 2)
+                self.assertEqual(queries, before, f"{case} ran {before} queries, then {queries} with more data")
+                self.assertLessEqual(queries, case.ceiling, f"{case} is over its query budget")
+                self.assertLess(elapsed, LATENCY_BUDGET, f"{case} took {elapsed:.3f}s")
+        baselines = os.environ.get("PERF_BASELINES")
+        if baselines:
+            with open(baselines, "w") as f:
+                json.dump(timings, f, indent=2, sort_keys=True)
+
+
+@override_settings(
+    CACHES=private_cache("profiling-tests"),
+    PROFILING_SAMPLE_RATE=1,
+)
+# Queries are counted on the primary
+@override_settings(DATABASE_REPLICAS={})
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", role=User.SELLER)
+        cls.listing = Listing.objects.create(title="Lamp", description="Desk lamp", starting_bid=5, creator=seller)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        timing = self.client.get(reverse("listing", args=[self.listing.pk]))["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries, 0 repeated", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse("index")))
+
+    @override_settings(PROFILING_MAX_REPEATS=3)
+    def test_repeated_queries_are_logged(self):
+        def n_plus_one(request):
+            for pk in range(3):
+                Listing.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(n_plus_one)
+        with self.assertLogs("auctions.profiling", "WARNING") as logs:
+            response = middleware(RequestFactory().get("/n-plus-one"))
+        self.assertIn('desc="3 queries, 2 repeated"', response["Server-Timing"])
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry["path"], entry["queries"], entry["repeated"]), ("/n-plus-one", 3, 2))
+        self.assertEqual(entry["top_sql"][0]["count"], 3)
+
+
+@override_settings(CACHES=private_cache("write-path-tests"), DATABASE_REPLICAS={})
+class WritePathTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", role=User.SELLER)
+        cls.buyer = User.objects.create_user("buyer")
+        cls.rival = User.objects.create_user("rival")
+
+    def setUp(self):
+        cache.clear()
+
+    def stocked(self, stock, **fields):
+        return Listing.objects.create(
+            title="Mug", description="Coffee mug", listing_type=Listing.BUY_NOW,
+            buy_now_price=Decimal("8"), stock=stock, creator=self.seller, **fields,
+        )
+
+    def test_buy_now_never_oversells(self):
+        listing = self.stocked(5)
+        services.buy_now(listing, self.buyer, 3)
+        with self.assertRaisesMessage(services.PurchaseRejected, "Not enough stock left"):
+            services.buy_now(listing, self.rival, 3)
+        services.buy_now(listing, self.rival, 2)
+        with self.assertRaises(services.PurchaseRejected):
+            services.buy_now(listing, self.buyer, 1)
+        listing.refresh_from_db()
+        self.assertEqual((listing.stock, listing.active), (0, False))
+        self.assertEqual(sum(Order.objects.filter(listing=listing).values_list("quantity", flat=True)), 5)
+
+    def test_repeated_cancel_restocks_once(self):
+        listing = self.stocked(5)
+        order = services.buy_now(listing, self.buyer, 2)
+        stale_copy = Order.objects.get(pk=order.pk)
+        self.assertTrue(services.cancel_order(order))
+        self.assertFalse(services.cancel_order(stale_copy))
+        listing.refresh_from_db()
+        self.assertEqual(listing.stock, 5)
+
+    def test_rejected_bid_leaves_the_listing_alone(self):
+        auction = Listing.objects.create(
+            title="Lamp", description="Desk lamp", starting_bid=Decimal("10"), creator=self.seller,
+        )
+        stale_copy = Listing.objects.get(pk=auction.pk)
+        services.place_bid(auction, self.buyer, Decimal("15"))
+        before = Listing.objects.values(
+            "bid_count", "highest_bid_amount", "highest_bidder", "effective_price", "version"
+        ).get(pk=auction.pk)
+        with self.assertRaises(services.BidRejected):
+            services.place_bid(stale_copy, self.rival, Decimal("12"))
+        after = Listing.objects.values(*before).get(pk=auction.pk)
+        self.assertEqual(after, before)
+        self.assertEqual((after["bid_count"], after["highest_bidder"]), (1, self.buyer.pk))
+        self.assertEqual(auction.bids.count(), 1)
+
+    def test_closing_an_auction_needs_a_post(self):
+        auction = Listing.objects.create(
+            title="Lamp", description="Desk lamp", starting_bid=Decimal("10"), creator=self.seller,
+        )
+        services.place_bid(auction, self.buyer, Decimal("15"))
+        self.client.force_login(self.seller)
+        path = reverse("close_listing", args=[auction.pk])
+        self.client.get(path)
+        self.assertTrue(Listing.objects.get(pk=auction.pk).active)
+        response = self.client.post(path, follow=True)
+        self.assertFalse(Listing.objects.get(pk=auction.pk).active)
+        self.assertEqual(Order.objects.get(listing=auction).buyer, self.buyer)
+        self.assertNotContains(response, "Activate Listing")
+
+    def auction(self, **fields):
+        return Listing.objects.create(
+            title="Lamp", description="Desk lamp", starting_bid=Decimal("10"), creator=self.seller, **fields,
+        )
+
+    def test_bids_after_the_end_time_are_rejected(self):
+        auction = self.auction(end_time=timezone.now() + timedelta(hours=1))
+        services.place_bid(auction, self.buyer, Decimal("15"))
+        # Ended, but not yet closed by the close_auctions worker
+        Listing.objects.filter(pk=auction.pk).update(end_time=timezone.now() - timedelta(seconds=1))
+        with self.assertRaisesMessage(services.BidRejected, "This auction has ended."):
+            services.place_bid(Listing.objects.get(pk=auction.pk), self.rival, Decimal("20"))
+        auction = Listing.objects.get(pk=auction.pk)
+        self.assertEqual((auction.highest_bidder, auction.highest_bid_amount, auction.bid_count), (self.buyer, 15, 1))
+        self.assertTrue(auction.active)
+
+    def test_expired_auctions_are_settled_once(self):
+        raced, expired = self.auction(), self.auction()
+        running = self.auction(end_time=timezone.now() + timedelta(hours=1))
+        for auction in (raced, expired, running):
+            services.place_bid(auction, self.buyer, Decimal("15"))
+            services.place_bid(auction, self.rival, Decimal("20"))
+        Listing.objects.filter(pk__in=[raced.pk, expired.pk]).update(end_time=timezone.now() - timedelta(minutes=1))
+
+        close_listing = services.close_listing
+
+        def seller_gets_there_first(listing):
+            # The seller's close lands between the worker picking the
+            # auction and closing it
+            if listing.pk == raced.pk:
+                self.assertTrue(close_listing(raced))
+            return close_listing(listing)
+
+        out = io.StringIO()
+        with mock.patch.object(services, "close_listing", side_effect=seller_gets_there_first):
+            call_command("close_auctions", stdout=out)
+        self.assertEqual(out.getvalue(), "Closed 1 auction(s).\n")
+        # And the seller closing after the worker
+        self.assertFalse(services.close_listing(expired))
+        self.assertEqual(services.close_expired_auctions(), 0)
+
+        for auction in (raced, expired):
+            auction = Listing.objects.get(pk=auction.pk)
+            self.assertEqual((auction.active, auction.winner, auction.final_price), (False, self.rival, 20))
+            order = Order.objects.get(listing=auction)
+            self.assertEqual((order.buyer, order.price, order.quantity, order.status), (self.rival, 20, 1, Order.PENDING))
+        self.assertTrue(Listing.objects.get(pk=running.pk).active)
+        self.assertFalse(Order.objects.filter(listing=running).exists())
+        rollup = SellerDailySales.objects.get(seller=self.seller, status=Order.PENDING)
+        self.assertEqual((rollup.orders, rollup.units, rollup.revenue), (2, 2, 40))
+
+    def test_rollups_follow_order_status(self):
+        listing = self.stocked(10)
+        kept = services.buy_now(listing, self.buyer, 2)
+        cancelled = services.buy_now(listing, self.rival, 3)
+        services.process_order(kept, timezone.now() + timedelta(days=2))
+        services.cancel_order(cancelled)
+        day = rollups.daily_summary(self.seller).get()
+        self.assertEqual(
+            (day["orders_total"], day["units_total"], day["revenue_total"], day["cancelled_total"]),
+            (1, 2, Decimal("16"), 1),
+        )
+        # Rows emptied by status changes stay behind at zero
+        stored = set(SellerDailySales.objects.exclude(orders=0).values_list("status", "orders", "units"))
+        recomputed = {
+            (row["status_value"], row["order_count"], row["unit_count"]) for row in rollups.rollups_from_orders()
+        }
+        self.assertEqual(stored, recomputed)
+
+    def test_keyset_cursors_visit_every_row_once(self):
+        for _ in range(11):
+            self.stocked(1)
+        listings = Listing.objects.all()
+        expected = list(listings.order_by("-date_time", "-pk").values_list("pk", flat=True))
+        paginator = KeysetPaginator(listings, ("-date_time", "-pk"), per_page=4)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual([listing.pk for page in pages for listing in page], expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+
+        back = paginator.page(before=pages[-1].previous_cursor)
+        self.assertEqual([listing.pk for listing in back], [listing.pk for listing in pages[1]])
+        with self.assertRaises(BadRequest):
+            paginator.page(after="not a cursor")
+        with self.assertRaises(BadRequest):
+            paginator.page(after=encode_cursor(["yesterday", 1]))
+        self.assertEqual(self.client.get(reverse("index"), {"after": "not a cursor"}).status_code, 400)
+
+    def test_keyset_cursors_walk_past_null_sort_keys(self):
+        for _ in range(5):
+            self.stocked(1)
+        unpriced = [self.stocked(1).pk for _ in range(6)]
+        Listing.objects.filter(pk__in=unpriced).update(effective_price=None)
+        listings = Listing.objects.all()
+        for ordering in [("effective_price", "pk"), ("-effective_price", "-pk")]:
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(listings, ordering, per_page=4)
+                pages = [paginator.page()]
+                while pages[-1].has_next:
+                    pages.append(paginator.page(after=pages[-1].next_cursor))
+                forward = [listing.pk for page in pages for listing in page]
+                self.assertEqual(len(forward), 11)
+                self.assertEqual(set(forward), set(listings.values_list("pk", flat=True)))
+                # NULL sorts lowest: first ascending, last descending
+                nulls = forward[:6] if ordering[0] == "effective_price" else forward[-6:]
+                self.assertEqual(set(nulls), set(unpriced))
+
+                backward = list(pages[-1])
+                page = pages[-1]
+                while page.has_previous:
+                    page = paginator.page(before=page.previous_cursor)
+                    backward[:0] = page
+                self.assertEqual([listing.pk for listing in backward], forward)
+
+    def test_stock_sold_since_the_page_loaded_is_not_overwritten(self):
+        sold, edited, untouched = self.stocked(5), self.stocked(5), self.stocked(5)
+        services.buy_now(sold, self.buyer, 3)
+        updated, stale = services.update_stock(self.seller, {
+            sold.pk: (5, 5), edited.pk: (5, 9), untouched.pk: (5, 5),
+        })
+        self.assertEqual((updated, stale), (1, []))
+        self.assertEqual(services.update_stock(self.seller, {sold.pk: (5, 10)}), (0, [sold.pk]))
+        stock = dict(Listing.objects.values_list("pk", "stock"))
+        self.assertEqual([stock[sold.pk], stock[edited.pk], stock[untouched.pk]], [2, 9, 5])
+
+    def test_stock_of_many_listings(self):
+        Listing.objects.bulk_create([
+            Listing(title="Mug", description="Coffee mug", listing_type=Listing.BUY_NOW,
+                    buy_now_price=Decimal("8"), stock=1, creator=self.seller)
+            for _ in range(1500)
+        ])
+        pks = Listing.objects.values_list("pk", flat=True)
+        updated, stale = services.update_stock(self.seller, {pk: (1, 2) for pk in pks})
+        self.assertEqual((updated, stale), (1500, []))
+
+    def test_bulk_stock_reports_listings_that_moved_on(self):
+        listing = self.stocked(5)
+        services.buy_now(listing, self.buyer, 3)
+        self.client.force_login(self.seller)
+        response = self.client.post(
+            reverse("bulk_stock"), {f"stock-{listing.pk}": "8", f"stock-orig-{listing.pk}": "5"}, follow=True,
+        )
+        self.assertContains(response, "1 listings sold or changed since the page loaded")
+        listing.refresh_from_db()
+        self.assertEqual(listing.stock, 2)
+
+    def test_seller_controls_leave_concurrent_sales_alone(self):
+        listing = self.stocked(5)
+        self.client.force_login(self.seller)
+        path = reverse("update_listing", args=[listing.pk])
+        # A sale lands while the request holds the listing it loaded
+        def load_then_sell(*args, **kwargs):
+            loaded = get_object_or_404(*args, **kwargs)
+            services.buy_now(listing, self.buyer, 2)
+            return loaded
+
+        with mock.patch("auctions.views.get_object_or_404", load_then_sell):
+            self.client.post(path, {"action": "toggle_status"})
+        listing.refresh_from_db()
+        self.assertEqual((listing.active, listing.stock), (False, 3))
+
+    def test_incremental_export_picks_up_bids(self):
+        auction = Listing.objects.create(
+            title="Lamp", description="Desk lamp", starting_bid=Decimal("10"), creator=self.seller,
+        )
+        self.stocked(5)
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+
+        def exported(since):
+            response = self.client.get(reverse("export", args=["listings"]), {"since": since.isoformat()})
+            return [json.loads(line)["id"] for line in b"".join(response.streaming_content).splitlines()]
+
+        cursor = timezone.now()
+        self.assertEqual(exported(cursor), [])
+        services.place_bid(auction, self.buyer, Decimal("12"))
+        self.assertEqual(exported(cursor), [auction.pk])
+
+    def test_import_stopped_by_a_bad_line_reports_what_it_kept(self):
+        rows = [b"title,description,starting_bid\n"] + [f"Mug {i},Coffee mug,5\n".encode() for i in range(3)]
+        lines = rows + [b"Caf\xe9,Latin-1,5\n", b"Cup,Tea cup,5\n"]
+        result = imports.import_listings(codecs.iterdecode(lines, "utf-8"), self.seller, batch_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors, [(5, "Not valid UTF-8; the import stopped here.")])
+        self.assertEqual(Listing.objects.filter(creator=self.seller).count(), 3)
+
+
+@override_settings(CACHES=private_cache("search-tests"), DATABASE_REPLICAS={})
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", role=User.SELLER)
+        listings = Listing.objects.bulk_create([
+            Listing(title=f"Vintage camera {i}", description="Film camera", starting_bid=5,
+                    effective_price=5, creator=seller)
+            for i in range(3000)
+        ] + [
+            Listing(title="Vintage lamp", description="Vintage brass desk lamp", starting_bid=5,
+                    effective_price=5, creator=seller),
+            Listing(title="Desk fan", description="Quiet", starting_bid=5, effective_price=5, creator=seller),
+        ])
+        search.index_listings(listing.pk for listing in listings)
+        cls.lamp = listings[-2]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_results_are_ranked(self):
+        results = search.search(Listing.objects.all(), "vintage lamp")
+        self.assertEqual([listing.pk for listing in results], [self.lamp.pk])
+        self.assertEqual(search.search(Listing.objects.all(), "vintage").first(), self.lamp)
+
+    def test_many_hits_match_once_per_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(reverse("index"), {"q": "vintage"})
+            self.client.get(reverse("index") + first.context["page"].next_url)
+        matches = [query["sql"].count("MATCH") for query in queries if "MATCH" in query["sql"]]
+        self.assertEqual(matches, [1, 1])
+
+    def test_cursors_walk_every_hit_once(self):
+        paginator = KeysetPaginator(search.search(Listing.objects.all(), "vintage"), ("search_rank", "pk"), per_page=500)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        seen = [listing.pk for page in pages for listing in page]
+        self.assertEqual(len(seen), 3001)
+        self.assertEqual(len(set(seen)), 3001)
+        self.assertEqual(seen[0], self.lamp.pk)
+
+
+@override_settings(CACHES=private_cache("page-cache-tests"), DATABASE_REPLICAS={})
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller", role=User.SELLER)
+        cls.buyer = User.objects.create_user("buyer")
+        cls.listing = Listing.objects.create(title="Lamp", description="Desk lamp", starting_bid=5, creator=cls.seller)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_counting_queries(self, url, **headers):
+        # A page served from the cache runs no queries of its own
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **headers)
+        return response, len(queries)
+
+    def test_repeat_anonymous_requests_are_not_modified(self):
+        for url in [reverse("index"), reverse("listing", args=[self.listing.pk])]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+                repeat, queries = self.get_counting_queries(url)
+                self.assertEqual((repeat.status_code, repeat["ETag"]), (200, first["ETag"]))
+                # The listing page reads the listing's version for its ETag
+                self.assertEqual(queries, 0 if url == reverse("index") else 1)
+
+    def test_catalog_writes_change_the_etag(self):
+        for url in [reverse("index"), reverse("listing", args=[self.listing.pk])]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                listing = Listing.objects.get(pk=self.listing.pk)
+                with self.captureOnCommitCallbacks(execute=True):
+                    services.place_bid(listing, self.buyer, listing.effective_price + 1)
+                changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(changed.status_code, 200)
+                self.assertNotEqual(changed["ETag"], etag)
+
+    def test_signed_in_and_session_requests_skip_the_cache(self):
+        url = reverse("index")
+        anonymous = self.client.get(url)
+
+        self.client.force_login(self.buyer)
+        signed_in = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous["ETag"])
+        self.assertEqual(signed_in.status_code, 200)
+        self.assertNotIn("ETag", signed_in)
+        self.assertIn("private", signed_in["Cache-Control"])
+        self.assertContains(signed_in, "Signed in as <strong>buyer</strong>")
+        self.client.logout()
+
+        # A session cookie alone keeps an anonymous request out too
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "anonymous-session"
+        with_session = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous["ETag"])
+        self.assertEqual(with_session.status_code, 200)
+        self.assertNotIn("ETag", with_session)
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+
+        # A signed-in page is never stored: the next anonymous request runs
+        # the view, and only then is the page cached
+        cache.clear()
+        self.client.force_login(self.buyer)
+        self.client.get(url)
+        self.client.logout()
+        page, queries = self.get_counting_queries(url)
+        self.assertGreater(queries, 0)
+        self.assertNotContains(page, "Signed in as")
+        page, queries = self.get_counting_queries(url)
+        self.assertEqual(queries, 0)
+
+
+@override_settings(CACHES=private_cache("seeding-tests"), DATABASE_REPLICAS={})
+class SeedingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, prefix, **options):
+        now = timezone.make_aware(datetime(2026, 1, 1, 12))
+        return seeding.Seeder(seed=7, prefix=prefix, buyers=5, sellers=2, categories=3, listings=12, now=now, **options)
+
+    def generated(self, prefix):
+        return list(
+            Listing.objects.filter(creator__username__startswith=f"{prefix}-")
+            .order_by("pk").values_list("title", "date_time", "end_time", "updated_at", "effective_price")
+        )
+
+    def test_same_seed_and_base_time_give_the_same_listings(self):
+        self.seed("first").run()
+        self.seed("second").run()
+        self.assertEqual(len(self.generated("first")), 12)
+        self.assertEqual(self.generated("first"), self.generated("second"))
+
+    def test_ids_of_deleted_listings_are_not_reused(self):
+        self.seed("first").run()
+        newest = Listing.objects.order_by("-pk")[:3]
+        deleted = set(newest.values_list("pk", flat=True))
+        Listing.objects.filter(pk__in=deleted).delete()
+        self.seed("second").run()
+        created = Listing.objects.filter(creator__username__startswith="second-").values_list("pk", flat=True)
+        self.assertGreater(min(created), max(deleted))
+        # Listings created the usual way carry on after the seeded ones
+        seller = User.objects.get(username="second-seller-0")
+        listing = Listing.objects.create(title="Lamp", description="Desk lamp", starting_bid=5, creator=seller)
+        self.assertEqual(listing.pk, max(created) + 1)
+
+
+@override_settings(
+    CACHES=private_cache("replica-routing-tests"),
+    DATABASE_REPLICAS={"replica_a": 2, "replica_b": 1},
+    REPLICA_PIN_SECONDS=30,
+)
+class ReplicaRoutingTests(SimpleTestCase):
+    # Routing decisions only: no replica is queried
+
+    def request(self, method="get", cookies=None, write=False):
+        reads = []
+
+        def view(request):
+            if write:
+                router.db_for_write(Listing)
+            reads.extend(router.db_for_read(model) for model in (Listing, User))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies or {})
+        response = ReplicaMiddleware(view)(request)
+        self.assertEqual(len(set(reads)), 1, "one request read from two databases")
+        return reads[0], response
+
+    def test_reads_are_spread_by_weight(self):
+        picks = [self.request()[0] for _ in range(6)]
+        self.assertEqual((picks.count("replica_a"), picks.count("replica_b")), (4, 2))
+
+    def test_unsafe_methods_read_from_the_primary(self):
+        self.assertEqual(self.request("post")[0], "default")
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        read, response = self.request(write=True)
+        self.assertEqual(read, "default")
+        cookie = response.cookies[REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 30)
+        self.assertEqual(self.request(cookies={REPLICA_PIN_COOKIE: cookie.value})[0], "default")
+        expired = str(int(time.time()) - 1)
+        self.assertIn(self.request(cookies={REPLICA_PIN_COOKIE: expired})[0], {"replica_a", "replica_b"})
+
+    def test_reads_without_writes_do_not_pin(self):
+        self.assertNotIn(REPLICA_PIN_COOKIE, self.request()[1].cookies)
+
+    def test_outside_requests_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Listing), "default")
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "set DATABASE_REPLICAS to test against replicas")
+@override_settings(CACHES=private_cache("replica-tests"))
+class ReplicaTests(TransactionTestCase):
+    # Under the test runner every replica mirrors the test database, so the
+    # replicas are always in sync and only where queries run is checked
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user("seller", role=User.SELLER)
+        self.listing = Listing.objects.create(title="Lamp", description="Desk lamp", starting_bid=5, creator=seller)
+        self.client.force_login(User.objects.create_user("buyer"))
+
+    def queries(self, method, *args, **kwargs):
+        cache.clear()
+        with ExitStack() as stack:
+            captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections}
+            response = getattr(self.client, method)(*args, **kwargs)
+        on_replicas = sum(len(captured[alias]) for alias in settings.DATABASE_REPLICAS)
+        return response, len(captured["default"]), on_replicas
+
+    def test_read_your_writes(self):
+        url = reverse("listing", args=[self.listing.pk])
+        _, on_primary, on_replicas = self.queries("get", url)
+        self.assertEqual(on_primary, 0)
+        self.assertGreater(on_replicas, 0)
+
+        response, on_primary, on_replicas = self.queries("post", url, {"amount": "7.00"})
+        self.assertEqual(on_replicas, 0)
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        response, on_primary, on_replicas = self.queries("get", url)
+        self.assertEqual(on_replicas, 0)
+        self.assertContains(response, "7.00")
+
+        del self.client.cookies[REPLICA_PIN_COOKIE]
+        _, on_primary, on_replicas = self.queries("get", url)
+        self.assertEqual(on_primary, 0)
@@ -8,7 +8,9 @@ urlpatterns = [
     path("logout", views.logout_view, name="logout"),
     path("register", views.register, name="register"),
     path("create-listing", views.create_listing, name="create_listing"),
+    path("create-listing/import", views.import_listings, name="import_listings"),
     path("listings/<int:id>", views.listing, name="listing",),
+    path("listings/<int:id>/events", views.listing_events, name="listing_events"),
     path("listings/<int:id>/close", views.close_listing, name="close_listing"),
     path("listings/<int:listing_id>/add-review", views.add_review, name="add_review"),
     path("listings/<int:id>/watchlist", views.toggle_watchlist, name="toggle_watchlist"),
@@ -20,9 +22,13 @@ urlpatterns = [
     path("become-seller/", views.become_seller, name="become_seller"),
     path("buy-now/<int:listing_id>/", views.buy_now, name="buy_now"),
     path("selling", views.seller_dashboard, name="seller_dashboard"),
+    path("selling/sales", views.seller_sales, name="seller_sales"),
+    path("selling/orders", views.bulk_orders, name="bulk_orders"),
+    path("selling/stock", views.bulk_stock, name="bulk_stock"),
     path("listings/<int:listing_id>/update", views.update_listing, name="update_listing"),
     path("orders/<int:order_id>/process", views.process_order, name="process_order"),
     path("orders/<int:order_id>/cancel", views.cancel_order, name="cancel_order"),
     path("orders/<int:order_id>/complete", views.complete_order, name="complete_order"),
+    path("export/<str:kind>", views.export, name="export"),
 ]
 
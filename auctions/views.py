@@ -1,16 +1,34 @@
+import codecs
+
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError
-from django.db.models import Q, Max
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseForbidden
+from django.db.models import Count, Q
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, HttpResponseForbidden, JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect,get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import events, exports, imports, rollups, search, services
+from .cache import CATEGORIES_VERSION_KEY, get_categories, get_category, get_category_listing_counts, get_version
 from .forms import ListingForm, BidForm, ReviewForm
-from .models import User, Listing, Category, Comment, Watchlist, Order, Review, Bid
+from .page_cache import anonymous_page_cache
+from .pagination import paginate
+from .models import User, Listing, Comment, Watchlist, Order, Review, Bid
+
 
+SORT_ORDERINGS = {
+    "newest": ("-date_time", "-pk"),
+    "price_asc": ("effective_price", "pk"),
+    "price_desc": ("-effective_price", "-pk"),
+}
 
+
+@anonymous_page_cache()
 def index(request):
     listings = Listing.objects.filter(active=True)
 
@@ -20,31 +38,31 @@ def index(request):
     max_price = request.GET.get("max_price")
 
     if query:
-        listings = listings.filter(
-            Q(title__icontains=query),
-            Q(description__icontains=query)
-        )
+        listings = search.search(listings, query)
 
     if category_id:
         listings = listings.filter(category_id=category_id)
 
     if min_price:
-        listings = listings.filter(starting_bid__gte=min_price)
+        listings = listings.filter(effective_price__gte=min_price)
 
     if max_price:
-        listings = listings.filter(starting_bid__lte=max_price)
-
-    if request.user.is_authenticated:
-        watchlist_count = request.user.watchlist_set.all()
-        return render(request, "auctions/index.html",{
-            "listings":listings,
-            "count":len(watchlist_count),
-            "categories":Category.objects.all()
-        })
+        listings = listings.filter(effective_price__lte=max_price)
+
+    # Search results default to relevance, everything else to newest first
+    sort = request.GET.get("sort")
+    if sort in SORT_ORDERINGS:
+        page = paginate(request, listings, ordering=SORT_ORDERINGS[sort])
+    elif query:
+        page = paginate(request, listings, ordering=("search_rank", "pk"))
     else:
-        return render(request, "auctions/index.html",{
-            "listings":listings,
-        })
+        page = paginate(request, listings)
+
+    return render(request, "auctions/index.html",{
+        "listings":page.object_list,
+        "page":page,
+        "categories":get_categories()
+    })
 
 
 def login_view(request):
@@ -120,15 +138,44 @@ def create_listing(request):
             messages.error(request, "Please correct the error below")
     else:
         form = ListingForm()
-        watchlist_items = Listing.objects.filter(watchlist__user = request.user)
 
     return render(request, "auctions/create_listing.html", {
         "form":form,
-        "count":watchlist_items.count()
     })
 
+# Rejected rows shown on the import page; the count covers all of them
+IMPORT_ERRORS_SHOWN = 200
+
+@login_required
+def import_listings(request):
+    if not request.user.is_seller():
+        return HttpResponseForbidden("Only seller can create listing")
+    result = None
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            messages.error(request, "Please choose a CSV file to import.")
+        else:
+            # A line that isn't UTF-8 or CSV ends the import and is
+            # reported with the rows' errors
+            result = imports.import_listings(codecs.iterdecode(upload, "utf-8-sig"), request.user)
+            messages.success(request, f"Imported {result.created} listings.")
+
+    return render(request, "auctions/import_listings.html", {
+        "result": result,
+        "errors": result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+        "columns": imports.COLUMNS,
+    })
+
+def listing_etag(request, id):
+    version = Listing.objects.filter(pk=id).values_list("version", flat=True).first()
+    if version is None:
+        return None
+    return f"{version}:{get_version(CATEGORIES_VERSION_KEY)}"
+
+@anonymous_page_cache(listing_etag)
 def listing(request, id):
-    listing = get_object_or_404(Listing, pk=id)
+    listing = get_object_or_404(Listing.objects.select_related("winner"), pk=id)
     form = BidForm()
     if request.method == 'POST':
         if not request.user.is_authenticated:
@@ -137,25 +184,19 @@ def listing(request, id):
         form = BidForm(request.POST)
         if form.is_valid():
             bid_amount = form.cleaned_data["amount"]
-            if bid_amount < listing.starting_bid:
-                messages.error(request, "Your bid must be greater than the Starting Bid")
-            elif bid_amount < listing.current_price:
-                messages.error(request, "Your bid must be grater than current Highest Bid")
+            try:
+                services.place_bid(listing, request.user, bid_amount)
+            except services.BidRejected as rejection:
+                messages.error(request, str(rejection))
             else:
-                bid = form.save(commit = False)
-                bid.bidder = request.user
-                bid.listing = listing
-                bid.save()
                 messages.success(request, "your bid was placed successfully.")
                 return redirect("listing", id=listing.id)
     review_form = ReviewForm()
-    comments = Comment.objects.filter(listing = listing)
+    comments = Comment.objects.filter(listing = listing).select_related("user")
     in_watchlist = False
-    watchlist_items = 0
     if request.user.is_authenticated:
         in_watchlist = listing.watchlist_set.filter(user = request.user).exists()
-        watchlist_items = Listing.objects.filter(watchlist__user = request.user).count()
-    reviews = listing.reviews.all()
+    reviews = listing.reviews.select_related("user")
     return render(request, "auctions/listing.html",{
         "listing":listing,
         "form":form,
@@ -163,17 +204,29 @@ def listing(request, id):
         "comments":comments,
         "reviews": reviews,
         "in_watchlist":in_watchlist,
-        "count":watchlist_items
     })
 
+async def listing_events(request, id):
+    # Live updates for the listing page; needs the ASGI server to stream
+    if not await Listing.objects.filter(pk=id).aexists():
+        raise Http404("No such listing.")
+    response = StreamingHttpResponse(events.stream(id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@login_required
 def close_listing(request, id):
     listing = get_object_or_404(Listing, pk = id)
-    if not request.user == listing.creator:
-        messages.error("You don't have permissions to close the listing")
+    # Closing settles the auction, so only POST allowed
+    if request.method != "POST":
+        messages.error(request, "Invalid request.")
         return redirect("listing", id = id)
-    
-    listing.active = False
-    listing.save()
+    if request.user.id != listing.creator_id:
+        messages.error(request, "You don't have permissions to close the listing")
+        return redirect("listing", id = id)
+
+    services.close_listing(listing)
     return redirect("listing", id = id)
 
 
@@ -191,33 +244,35 @@ def toggle_watchlist(request, id):
 
 @login_required
 def watchlist(request):
-    watchlist_items = request.user.watchlist_set.all()
-    listings = [item.listing for item in watchlist_items]
+    listings = Listing.objects.filter(watchlist__user=request.user)
+    page = paginate(request, listings)
     return render(request, "auctions/index.html", {
-        "listings":listings,
-        "count": len(listings),
-        "categories":Category.objects.all()
+        "listings":page.object_list,
+        "page":page,
+        "categories":get_categories()
     })
 
+@anonymous_page_cache()
 def categories(request):
-    categories = Category.objects.all()
-    watchlist_items = 0
-    if request.user.is_authenticated:
-        watchlist_items = Listing.objects.filter(watchlist__user = request.user).count()
+    listing_counts = get_category_listing_counts()
+    categories = [
+        (category, listing_counts.get(category.pk, 0))
+        for category in get_categories()
+    ]
     return render(request, "auctions/categories.html",{
         "categories":categories,
-        "count": watchlist_items
     })
 
+@anonymous_page_cache()
 def category(request, category):
-    category = get_object_or_404(Category, name = category)
+    category = get_category(category)
+    if category is None:
+        raise Http404("No such category.")
     listings = Listing.objects.filter(category = category, active = True)
-    watchlist_items = 0
-    if request.user.is_authenticated:
-        watchlist_items = Listing.objects.filter(watchlist__user = request.user).count()
+    page = paginate(request, listings)
     return render(request, "auctions/index.html",{
-        "listings":listings,
-        "count": watchlist_items
+        "listings":page.object_list,
+        "page":page,
     })
 
 
@@ -238,58 +293,23 @@ def become_seller(request):
 def buy_now(request, listing_id):
     listing = get_object_or_404(Listing, id=listing_id)
 
-    if listing.stock <= 0:
-        messages.error(request, "This item is out of stock.")
-        return redirect("listing", listing_id)
-
-    
-
-    if listing.stock == 0:
-        listing.active = False
-
-    listing.save()
-
     # Only POST allowed
     if request.method != "POST":
         messages.error(request, "Invalid request.")
         return redirect("listing", listing_id)
 
-    # Must be Buy Now listing
-    if listing.listing_type != Listing.BUY_NOW:
-        messages.error(request, "This item is not available for direct purchase.")
-        return redirect("listing", listing_id)
-
-    # Listing must be active
-    if not listing.active:
-        messages.error(request, "This listing is no longer active.")
-        return redirect("listing", listing_id)
-
-    # Seller cannot buy own item
-    if listing.creator == request.user:
-        messages.error(request, "You cannot buy your own listing.")
-        return redirect("listing", listing_id)
-
     try:
         quantity = int(request.POST.get("quantity", 1))
-        if(quantity > listing.stock):
-            messages.error(request, "Invalid quantity.")
-            return redirect("listing", listing_id)
     except ValueError:
         messages.error(request, "Invalid quantity.")
         return redirect("listing", listing_id)
-    
+
     # ✅ Perform purchase (Pending Order)
-    Order.objects.create(
-        buyer=request.user,
-        listing=listing,
-        price=listing.buy_now_price,
-        quantity = quantity,
-        status=Order.PENDING
-    )
-    listing.stock-=quantity
-    if listing.stock == 0:
-        listing.active = False
-    listing.save()
+    try:
+        services.buy_now(listing, request.user, quantity)
+    except services.PurchaseRejected as rejection:
+        messages.error(request, str(rejection))
+        return redirect("listing", listing_id)
 
     messages.success(
         request,
@@ -308,11 +328,11 @@ def add_review(request, listing_id):
     ).exists()
 
     # Check if user won the auction
-    is_winner = False
-    if not listing.active and listing.listing_type == Listing.AUCTION:
-        highest_bid = listing.highest_bid()
-        if highest_bid and highest_bid.bidder == request.user:
-            is_winner = True
+    is_winner = (
+        not listing.active
+        and listing.listing_type == Listing.AUCTION
+        and listing.winner_id == request.user.id
+    )
 
     if not has_order and not is_winner:
         messages.error(request, "You can only review items you purchased or won.")
@@ -328,7 +348,7 @@ def add_review(request, listing_id):
             review = form.save(commit=False)
             review.user = request.user
             review.listing = listing
-            review.save()
+            services.add_review(review)
             messages.success(request, "Thank you for your feedback!")
             return redirect("listing", listing_id)
 
@@ -343,24 +363,8 @@ def purchased_items(request):
     cancelled_orders = all_orders.filter(status=Order.CANCELLED)
 
     # 2. Won Auctions
-    # Get all inactive auction listings where the user placed a bid
-    # Then filter in Python to find ones where they are the highest bidder
-    
-    # Optimization: Filter listings that are closed, are auctions, and user bid on them
-    candidates = Listing.objects.filter(
-        active=False, 
-        listing_type=Listing.AUCTION,
-        bids__bidder=request.user
-    ).distinct()
-
-    won_auctions = []
-    for listing in candidates:
-        highest = listing.highest_bid()
-        if highest and highest.bidder == request.user:
-            won_auctions.append(listing)
-
-    # Calculate count for watchlist (sidebar/header usually needs it)
-    watchlist_count = Listing.objects.filter(watchlist__user=request.user).count()
+    # Settled auctions the user won
+    won_auctions = paginate(request, request.user.won_listings.all(), ordering=("-pk",), prefix="won_")
 
     return render(request, "auctions/purchased.html", {
         "pending_orders": pending_orders,
@@ -368,83 +372,153 @@ def purchased_items(request):
         "completed_orders": completed_orders,
         "cancelled_orders": cancelled_orders,
         "won_auctions": won_auctions,
-        "count": watchlist_count,
-        "categories": Category.objects.all(),
+        "categories": get_categories(),
         "now": timezone.now()
     })
 
 @login_required
 def auctioned_listings(request):
-    # 1. Active Bids
-    # Listings that are active, are auctions, and user has bid on them
-    active_bids_listings = Listing.objects.filter(
-        active=True,
-        listing_type=Listing.AUCTION,
-        bids__bidder=request.user
-    ).distinct()
-
-    active_bids = []
-    for listing in active_bids_listings:
-        # Get user's max bid on this listing
-        user_max_bid = listing.bids.filter(bidder=request.user).aggregate(Max('amount'))['amount__max']
-        listing.user_max_bid = user_max_bid
-        active_bids.append(listing)
-
-    # 2. Lost Auctions
-    # Listings that are closed, are auctions, user bid on them, but user is NOT the winner
-    lost_candidates = Listing.objects.filter(
-        active=False,
-        listing_type=Listing.AUCTION,
-        bids__bidder=request.user
-    ).distinct()
-
-    lost_auctions = []
-    for listing in lost_candidates:
-        highest = listing.highest_bid()
-        # If there is a winner and it is NOT the current user
-        if highest and highest.bidder != request.user:
-            # Get user's max bid
-            user_max_bid = listing.bids.filter(bidder=request.user).aggregate(Max('amount'))['amount__max']
-            listing.user_max_bid = user_max_bid
-            lost_auctions.append(listing)
-
-    watchlist_count = Listing.objects.filter(watchlist__user=request.user).count()
+    # Every auction the user bid on, classified in SQL; each list is one query
+    bid_on = Listing.objects.bid_on_by(request.user)
+    active_bids = paginate(request, bid_on.filter(outcome="active"), ordering=("-pk",), prefix="active_")
+    lost_auctions = paginate(request, bid_on.filter(outcome="lost"), ordering=("-pk",), prefix="lost_")
 
     return render(request, "auctions/auctioned_listings.html", {
         "active_bids": active_bids,
         "lost_auctions": lost_auctions,
-        "count": watchlist_count,
-        "categories": Category.objects.all()
+        "categories": get_categories()
     })
 
+SALES_PANEL_DAYS = 14
+
+SELLER_TABS = ["listings", Order.PENDING, Order.PROCESSED, Order.COMPLETED, Order.CANCELLED]
+
 @login_required
 def seller_dashboard(request):
     if not request.user.is_seller():
         return HttpResponseForbidden("Only registered sellers can view this dashboard.")
 
-    # Get all listings created by this user, ordered by date
-    my_listings = Listing.objects.filter(creator=request.user).order_by("-date_time")
-    
-    # Get orders for these listings
-    all_orders = Order.objects.filter(listing__creator=request.user).order_by("-created_at")
+    tab = request.GET.get("tab")
+    if tab not in SELLER_TABS:
+        tab = "listings"
 
-    pending_orders = all_orders.filter(status=Order.PENDING)
-    processed_orders = all_orders.filter(status=Order.PROCESSED)
-    completed_orders = all_orders.filter(status=Order.COMPLETED)
-    cancelled_orders = all_orders.filter(status=Order.CANCELLED)
+    orders = Order.objects.filter(listing__creator=request.user)
 
-    watchlist_count = Listing.objects.filter(watchlist__user=request.user).count()
+    # Tab badges for every status in one pass over the seller's orders
+    order_counts = orders.aggregate(**{
+        status: Count("pk", filter=Q(status=status))
+        for status in SELLER_TABS[1:]
+    })
+
+    # Only the open tab's rows are fetched, a page at a time
+    if tab == "listings":
+        listings = Listing.objects.filter(creator=request.user)
+        page = paginate(request, listings)
+    else:
+        orders = orders.filter(status=tab).select_related("listing", "buyer")
+        page = paginate(request, orders, ordering=("-created_at", "-pk"))
 
     return render(request, "auctions/seller_dashboard.html", {
-        "listings": my_listings,
-        "pending_orders": pending_orders,
-        "processed_orders": processed_orders,
-        "completed_orders": completed_orders,
-        "cancelled_orders": cancelled_orders,
-        "count": watchlist_count,
-        "categories": Category.objects.all()
+        "tab": tab,
+        "page": page,
+        "order_counts": order_counts,
+        "sales": rollups.daily_summary(request.user, days=SALES_PANEL_DAYS),
+        "sales_days": SALES_PANEL_DAYS,
+        "categories": get_categories(),
+        "now": timezone.now()
+    })
+
+@login_required
+def seller_sales(request):
+    # Daily sales as JSON, read from the rollups only
+    if not request.user.is_seller():
+        return HttpResponseForbidden("Only registered sellers can view sales.")
+    try:
+        days = min(max(int(request.GET.get("days", 30)), 1), 366)
+    except ValueError:
+        days = 30
+    return JsonResponse({
+        "days": [
+            {
+                "day": row["day"].isoformat(),
+                "orders": row["orders_total"] or 0,
+                "units": row["units_total"] or 0,
+                "revenue": f"{row['revenue_total'] or 0:.2f}",
+                "cancelled": row["cancelled_total"] or 0,
+            }
+            for row in rollups.daily_summary(request.user, days=days)
+        ]
     })
 
+@login_required
+def bulk_orders(request):
+    # Process or cancel the selected orders in one go
+    if not request.user.is_seller():
+        return HttpResponseForbidden("Only registered sellers can manage orders.")
+    tab = request.POST.get("tab", Order.PENDING)
+    if tab not in SELLER_TABS:
+        tab = Order.PENDING
+    back = redirect(f"{reverse('seller_dashboard')}?tab={tab}")
+    if request.method != "POST":
+        return back
+
+    try:
+        order_ids = [int(pk) for pk in request.POST.getlist("order")]
+    except ValueError:
+        order_ids = []
+    if not order_ids:
+        messages.error(request, "Select at least one order.")
+        return back
+
+    action = request.POST.get("action")
+    if action == "process":
+        delivery_date = parse_datetime(request.POST.get("delivery_date", ""))
+        if delivery_date is None:
+            messages.error(request, "A valid delivery date is required.")
+            return back
+        if timezone.is_naive(delivery_date):
+            delivery_date = timezone.make_aware(delivery_date)
+        done = services.process_orders(request.user, order_ids, delivery_date)
+        messages.success(request, f"Processed {done} of {len(order_ids)} selected orders.")
+    elif action == "cancel":
+        done = services.cancel_orders(request.user, order_ids)
+        messages.success(request, f"Cancelled {done} of {len(order_ids)} selected orders.")
+    else:
+        messages.error(request, "Invalid action.")
+    return back
+
+@login_required
+def bulk_stock(request):
+    # Stock for many Buy Now listings, from stock-<listing id> fields and the
+    # stock-orig-<listing id> values they were rendered with
+    if not request.user.is_seller():
+        return HttpResponseForbidden("Only registered sellers can update stock.")
+    if request.method == "POST":
+        stock_by_listing = {}
+        for name, value in request.POST.items():
+            if not name.startswith("stock-") or name.startswith("stock-orig-"):
+                continue
+            try:
+                listing_id, stock = int(name[len("stock-"):]), int(value)
+                shown = int(request.POST[f"stock-orig-{listing_id}"])
+            except (KeyError, ValueError):
+                messages.error(request, "Invalid stock value.")
+                break
+            if stock < 0:
+                messages.error(request, "Stock cannot be negative.")
+                break
+            stock_by_listing[listing_id] = (shown, stock)
+        else:
+            updated, stale = services.update_stock(request.user, stock_by_listing)
+            messages.success(request, f"Stock updated for {updated} listings.")
+            if stale:
+                messages.warning(
+                    request,
+                    f"{len(stale)} listings sold or changed since the page loaded and were not updated. "
+                    "Check their current stock and try again.",
+                )
+    return redirect(request.META.get('HTTP_REFERER', 'seller_dashboard'))
+
 @login_required
 def update_listing(request, listing_id):
     listing = get_object_or_404(Listing, id=listing_id)
@@ -456,10 +530,17 @@ def update_listing(request, listing_id):
     if request.method == "POST":
         action = request.POST.get("action")
 
-        if action == "toggle_status":
+        if action == "toggle_status" and listing.listing_type == Listing.AUCTION:
+            # Deactivating an auction closes and settles it for good
+            if services.close_listing(listing):
+                messages.success(request, f"Auction '{listing.title}' has been closed.")
+            else:
+                messages.error(request, "A closed auction cannot be reactivated.")
+
+        elif action == "toggle_status":
             # Toggle active status
             listing.active = not listing.active
-            listing.save()
+            listing.save(update_fields=["active"])
             status_msg = "activated" if listing.active else "deactivated"
             messages.success(request, f"Listing '{listing.title}' has been {status_msg}.")
 
@@ -472,7 +553,7 @@ def update_listing(request, listing_id):
                          messages.error(request, "Stock cannot be negative.")
                     else:
                         listing.stock = new_stock
-                        listing.save()
+                        listing.save(update_fields=["stock"])
                         messages.success(request, f"Stock updated for '{listing.title}'.")
                 except ValueError:
                     messages.error(request, "Invalid stock value.")
@@ -485,10 +566,10 @@ def update_listing(request, listing_id):
 
 @login_required
 def process_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.select_related("listing"), id=order_id)
 
     # Ensure user is the seller of the listing
-    if order.listing.creator != request.user:
+    if order.listing.creator_id != request.user.id:
         return HttpResponseForbidden("You do not have permission to process this order.")
 
     if request.method == "POST":
@@ -496,52 +577,32 @@ def process_order(request, order_id):
         
         if not delivery_date_str:
             messages.error(request, "Delivery date is required.")
-            return redirect("seller_dashboard")
+            return redirect(f"{reverse('seller_dashboard')}?tab={Order.PENDING}")
 
-        try:
-             # Parse datetime if needed, Django usually handles this well with correct input type
-            order.delivery_date = delivery_date_str
-            order.status = Order.PROCESSED
-            order.save()
-            messages.success(request, f"Order #{order.id} processed with delivery set to {delivery_date_str}.")
-        except Exception:
-             messages.error(request, "Invalid date format.")
+        delivery_date = parse_datetime(delivery_date_str)
+        if delivery_date is None:
+            messages.error(request, "Invalid date format.")
+        else:
+            if timezone.is_naive(delivery_date):
+                delivery_date = timezone.make_aware(delivery_date)
+            if services.process_order(order, delivery_date):
+                messages.success(request, f"Order #{order.id} processed with delivery set to {delivery_date_str}.")
+            else:
+                messages.error(request, "Only pending orders can be processed.")
 
         
-    return redirect("seller_dashboard")
+    return redirect(f"{reverse('seller_dashboard')}?tab={Order.PENDING}")
 
 @login_required
 def cancel_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.select_related("listing"), id=order_id)
     
     # Allow buyer or seller to cancel
-    if request.user != order.buyer and request.user != order.listing.creator:
+    if request.user.id not in (order.buyer_id, order.listing.creator_id):
         return HttpResponseForbidden("You do not have permission to cancel this order.")
 
-    # Rules for cancellation
-    can_cancel = False
-    
-    # Pending orders can always be cancelled
-    if order.status == Order.PENDING:
-        can_cancel = True
-    
-    # Processed orders can be cancelled if delivery date is in future
-    elif order.status == Order.PROCESSED and order.delivery_date:
-        if order.delivery_date > timezone.now():
-            can_cancel = True
-            
-    if can_cancel:
-        order.status = Order.CANCELLED
-        
-        # Restore stock
-        order.listing.stock += order.quantity
-        if order.listing.stock > 0 and not order.listing.active:
-             # Optionally reactivate listing or leave it inactive? 
-             # Let's leave it as is unless stock was 0
-             pass
-        order.listing.save()
-        
-        order.save()
+    # Pending orders can always be cancelled, processed ones until delivery
+    if services.cancel_order(order):
         messages.success(request, f"Order #{order.id} has been cancelled.")
     else:
         messages.error(request, "This order cannot be cancelled.")
@@ -550,18 +611,40 @@ def cancel_order(request, order_id):
 
 @login_required
 def complete_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
-    
-    if request.user != order.buyer:
+    order = get_object_or_404(Order.objects.select_related("listing"), id=order_id)
+
+    if request.user.id != order.buyer_id:
         return HttpResponseForbidden("Only the buyer can complete the order.")
-        
+
     if order.status == Order.PROCESSED:
-        
-        if order.delivery_date and order.delivery_date <= timezone.now():
-             order.status = Order.COMPLETED
-             order.save()
+        if services.complete_order(order):
              messages.success(request, f"Order #{order.id} marked as received/completed.")
         else:
              messages.error(request, "You cannot complete this order yet (wait for delivery time).")
     
-    return redirect("purchased_items")
\ No newline at end of file
+    return redirect("purchased_items")
+
+@login_required
+def export(request, kind):
+    # Streams the whole table (or the part after since/since_id) for staff
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only staff can export data.")
+    data_export = exports.EXPORTS.get(kind)
+    if data_export is None:
+        raise Http404("No such export.")
+    format = request.GET.get("format", "ndjson")
+    if format not in exports.FORMATS:
+        return HttpResponseBadRequest("format must be ndjson or csv.")
+    try:
+        since, since_id = exports.parse_filters(
+            request.GET.get("since"), request.GET.get("since_id"), data_export
+        )
+    except exports.ExportError as error:
+        return HttpResponseBadRequest(str(error))
+
+    response = StreamingHttpResponse(
+        exports.render(data_export, format, since=since, since_id=since_id),
+        content_type=exports.FORMATS[format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{kind}.{format}"'
+    return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.profiling.ProfilingMiddleware',
+    'auctions.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,7 +63,8 @@ ROOT_URLCONF = 'commerce.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, with render time added to request profiles
+        'BACKEND': 'auctions.profiling.ProfilingTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.watchlist_count',
             ],
         },
     },
@@ -80,12 +85,114 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# SQLite tuned for concurrent web and worker processes: WAL lets readers run
+# alongside the single writer, synchronous=NORMAL is durable under WAL except
+# on power loss, and the page cache and memory map keep hot pages out of
+# read() calls. Transactions begin IMMEDIATE so a write transaction takes the
+# write lock up front and waits out the busy timeout, instead of failing with
+# "database is locked" when it tries to upgrade a read lock.
+# Persistent connections are reused by threads that outlive a request (sync
+# workers, management commands). Under ASGI every request runs in a fresh
+# thread, so the web process sets DB_CONN_MAX_AGE=0 (see Procfile).
+# Measure with `manage.py bench_sqlite`.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            # Busy timeout, in seconds
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-32000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA journal_size_limit=67108864'
+            ),
+        },
+    }
+}
+
+# Read replicas (auctions.routers): DATABASE_REPLICAS lists replica SQLite
+# files, comma separated, each optionally weighted as "path*weight". The
+# files are kept in step with db.sqlite3 outside Django; under `manage.py
+# test` every replica mirrors the test database. Replicas on another server
+# go in DATABASES and DATABASE_REPLICAS by hand. A client that writes reads
+# from the primary for the next REPLICA_PIN_SECONDS.
+
+DATABASE_ROUTERS = ['auctions.routers.ReplicaRouter']
+
+DATABASE_REPLICAS = {}
+for number, spec in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    path, _, weight = spec.strip().partition('*')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'OPTIONS': {
+            **DATABASES['default']['OPTIONS'],
+            'init_command': DATABASES['default']['OPTIONS']['init_command'] + ';PRAGMA query_only=ON',
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# File based so that all gunicorn workers on a host share entries and see
+# each other's invalidations. The working set is a catalog card, a seller
+# card, a page header and a cached page per listing version, plus per-user
+# watchlist counts, so MAX_ENTRIES allows for about four entries per live
+# listing; when it is reached a tenth of the entries are dropped at random.
+# Every cache write lists the cache directory, so past a few tens of
+# thousands of entries set REDIS_URL to use Redis (needs the redis package),
+# which evicts least recently used entries itself.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '20000')),
+            'CULL_FREQUENCY': 10,
+        },
     }
 }
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+# Fragments are keyed on (listing id, version), and both restart when the
+# database does, so entries outlive the rows they were rendered from. Clear
+# the cache (delete CACHE_DIR, or FLUSHDB on Redis) whenever the database is
+# replaced, flushed or restored from a backup. Test runs get a private
+# in-memory cache so they never read or write the one the server uses.
+if sys.argv[1:2] == ['test']:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tests',
+        }
+    }
+
+# Processes streaming live listing events register their loopback port here
+EVENTS_DIR = os.environ.get('EVENTS_DIR', os.path.join(BASE_DIR, '.events'))
+
+# Request profiling (auctions.profiling): the share of requests profiled, and
+# the thresholds past which a profiled request is logged as slow
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', '500'))
+PROFILING_MAX_QUERIES = int(os.environ.get('PROFILING_MAX_QUERIES', '30'))
+PROFILING_MAX_REPEATS = int(os.environ.get('PROFILING_MAX_REPEATS', '5'))
 
 AUTH_USER_MODEL = 'auctions.User'
 